@@ -0,0 +1,218 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from sentiment_model import analyze_with_vader, analyze_with_roberta
+from enhanced_response_generator import is_crisis, get_contextual_response, generate_noncontextual_response_details
+from mood_trajectory import record_mood
+from prosody import add_transcript_rates
+
+# Sentiment fields that are only computed when something needs them
+SENTIMENT_FIELDS = ('vader_result', 'roberta_result', 'overall_sentiment')
+
+# Runs deferred crisis-path work for pipelines that have no stage pool (queued jobs, profiled requests)
+_deferred_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="deferred-stage")
+
+# Latest deferred (crisis) update per session; later updates to the same session wait for it so
+# each session's trajectory is applied in arrival order, while other sessions never wait
+_pending_updates = {}
+_pending_lock = threading.Lock()
+
+def _wait_for_pending(session_id):
+    with _pending_lock:
+        previous = _pending_updates.get(session_id)
+    if previous is not None:
+        # A failed earlier update must not block this one
+        wait([previous])
+
+def _forget_pending(session_id, future):
+    with _pending_lock:
+        if _pending_updates.get(session_id) is future:
+            del _pending_updates[session_id]
+
+class AnalysisPipeline:
+    """Lazily evaluated analysis stages for one message; each stage runs at most once, on first use.
+    With an executor, independent stages can be started early and overlap with contextual matching."""
+
+    def __init__(self, text, executor=None, vader_result=None, started=None):
+        self.text = text
+        self.crisis = is_crisis(text)
+        self.timings = {}
+        self._executor = executor
+        self._futures = {}
+        # Stages something actually used (started speculatively doesn't count)
+        self._needed = set()
+        self._lock = threading.Lock()
+        self._response = None
+        # Handlers pass their own start time so the reported total includes work before the pipeline
+        self._started = started if started is not None else time.perf_counter()
+
+        # Callers that scored VADER in bulk (e.g. the replay harness) pass the score in
+        if vader_result is not None:
+            future = self._futures['vader_result'] = Future()
+            future.set_result(vader_result)
+
+    def _run_stage(self, name, compute, future):
+        start = time.perf_counter()
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            return
+        self.timings[name] = (time.perf_counter() - start) * 1000
+        future.set_result(value)
+
+    def _start_stage(self, name, compute, executor=None):
+        """Future for a stage, starting it (on the executor, or in this thread) if it hasn't been started"""
+        with self._lock:
+            future = self._futures.get(name)
+            if future is not None:
+                return future
+            future = self._futures[name] = Future()
+
+        if executor is None:
+            self._run_stage(name, compute, future)
+        else:
+            executor.submit(self._run_stage, name, compute, future)
+        return future
+
+    def _stage(self, name, compute):
+        self._needed.add(name)
+        return self._start_stage(name, compute).result()
+
+    def _is_finished(self, name):
+        future = self._futures.get(name)
+        return future is not None and future.done() and future.exception() is None
+
+    def _finished_value(self, name):
+        """A stage's value if it already finished successfully, without waiting for it"""
+        return self._futures[name].result() if self._is_finished(name) else None
+
+    def _compute_vader(self):
+        return analyze_with_vader(self.text)
+
+    def _compute_roberta(self):
+        # RoBERTa's fallback shares the VADER stage (waiting for it if it is running) instead of scoring again
+        return analyze_with_roberta(self.text, lambda: self.vader_result)
+
+    @property
+    def vader_result(self):
+        return self._stage('vader_result', self._compute_vader)
+
+    @property
+    def roberta_result(self):
+        return self._stage('roberta_result', self._compute_roberta)
+
+    @property
+    def overall_sentiment(self):
+        return self._stage('overall_sentiment', lambda: (self.vader_result + self.roberta_result) / 2)
+
+    def start_stages(self, fields=()):
+        """Start the sentiment stages on the executor so they run while contextual matching does"""
+        if self._executor is None or self.crisis:
+            return
+        # VADER is cheap and needed whenever no contextual pattern matches, so it always starts early
+        self._start_stage('vader_result', self._compute_vader, self._executor)
+        if 'roberta_result' in fields or 'overall_sentiment' in fields:
+            self._start_stage('roberta_result', self._compute_roberta, self._executor)
+
+    @property
+    def response(self):
+        """The therapist reply; sentiment is only computed if no contextual pattern matches"""
+        if self._response is None:
+            start = time.perf_counter()
+            contextual_response = get_contextual_response(self.text)
+            self.timings['contextual'] = (time.perf_counter() - start) * 1000
+
+            if contextual_response:
+                self._response = {'response': contextual_response, 'path': 'crisis' if self.crisis else 'contextual'}
+            else:
+                # generate_response only ever uses the VADER score
+                details = generate_noncontextual_response_details(self.vader_result, self.text)
+                self.timings.update(details['timings'])
+                self._response = details
+        return self._response['response']
+
+    @property
+    def path(self):
+        """Which path produced the reply (crisis, contextual, ai, retrieval or a fallback)"""
+        self.response
+        return self._response['path']
+
+    def record_session(self, session_id):
+        """Update the session's mood trajectory; on the crisis path this is deferred until after the reply"""
+        if self.crisis:
+            with _pending_lock:
+                previous = _pending_updates.get(session_id)
+                future = (self._executor or _deferred_executor).submit(self._record_deferred, session_id, previous)
+                _pending_updates[session_id] = future
+            future.add_done_callback(lambda done: _forget_pending(session_id, done))
+            return None
+        score = self.overall_sentiment
+        _wait_for_pending(session_id)
+        return record_mood(session_id, score, self.text)
+
+    def _record_deferred(self, session_id, previous):
+        # Sentiment (possibly a RoBERTa load) is computed first; only the update waits for earlier ones
+        score = self.overall_sentiment
+        if previous is not None:
+            wait([previous])
+        return record_mood(session_id, score, self.text)
+
+    def compute_fields(self, fields):
+        """Compute the requested sentiment fields now (never on the crisis path)"""
+        if self.crisis:
+            return
+        for field in SENTIMENT_FIELDS:
+            if field in fields:
+                getattr(self, field)
+
+    def to_result(self, text_key, fields=(), timings=False, session_id=None):
+        """Build the response body, computing requested sentiment fields (never on the crisis path)
+        and updating the session's mood trajectory when a session ID is given"""
+        # Recording the session needs the overall sentiment, so start it alongside the reply
+        self.start_stages(tuple(fields) + (('overall_sentiment',) if session_id else ()))
+        result = {text_key: self.text, "response": self.response}
+
+        if session_id:
+            result["session_trajectory"] = self.record_session(session_id)
+
+        self.compute_fields(fields)
+
+        # Only report what the reply, the session or the client needed, so the body doesn't depend on
+        # whether a speculative stage happened to finish (crisis-path sentiment is always computed later)
+        reported = [field for field in SENTIMENT_FIELDS if field in self._needed and not self.crisis]
+        for field in SENTIMENT_FIELDS:
+            result[field] = self._finished_value(field) if field in reported else None
+
+        result["computed"] = reported
+        result["deferred"] = [field for field in SENTIMENT_FIELDS if field not in reported]
+
+        if timings:
+            # Stages overlap, so the total can be well below the sum of the stage timings
+            stage_timings = dict(self.timings)
+            stage_timings['total'] = (time.perf_counter() - self._started) * 1000
+            result["timings"] = {stage: round(value, 3) for stage, value in stage_timings.items()}
+        return result
+
+def audio_result(pipeline, prosody, fields=(), timings=False, session_id=None):
+    """Response body for an analyzed recording (shared by /analyze-audio and queued jobs)"""
+    result = pipeline.to_result("transcribed_text", fields, timings=timings, session_id=session_id)
+    result["prosody"] = add_transcript_rates(prosody, pipeline.text) if prosody else None
+    return result
+
+def parse_fields(value):
+    """Normalize the requested sentiment fields ("all", a list, or a comma-separated string)"""
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        value = [field.strip() for field in value.split(',') if field.strip()]
+    elif not isinstance(value, (list, tuple)):
+        raise ValueError("'fields' must be \"all\", a list or a comma-separated string")
+
+    unknown = [field for field in value if field != 'all' and field not in SENTIMENT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(map(str, unknown))} (expected \"all\" or any of {', '.join(SENTIMENT_FIELDS)})")
+    if 'all' in value:
+        return SENTIMENT_FIELDS
+    return tuple(field for field in SENTIMENT_FIELDS if field in value)
@@ -1,10 +1,18 @@
 from flask import Flask, request, jsonify
-from sentiment_model import analyze_with_vader, analyze_with_roberta
-from speech_to_text import transcribe_audio
-from enhanced_response_generator import generate_response
+from transcription_cache import transcribe_audio_cached, hash_audio_file
+from generation_stats import get_generation_stats
+from request_profiler import profiled, list_profiles, is_profiling
+from model_registry import get_registry_status
+from audio_jobs import submit_job, get_job, start_job_workers
+from mood_trajectory import get_session_trajectory
+from analysis_pipeline import AnalysisPipeline, audio_result, parse_fields
+from prosody import analyze_prosody_cached
 
 import os
+import time
 import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 from flask_cors import CORS
 
@@ -15,9 +23,42 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
+# Background workers for queued audio analysis jobs
+start_job_workers()
+
+# Shared pool for request stages that run alongside each other (prosody next to transcription,
+# sentiment next to contextual matching)
+STAGE_WORKERS = int(os.environ.get("STAGE_WORKERS", "4"))
+stage_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="stage")
+
+# Include per-stage timings (ms) in analysis responses; per request with ?debug=timings
+DEBUG_TIMINGS = os.environ.get("DEBUG_TIMINGS", "false").lower() == "true"
+
+
+def collect_prosody(prosody_future, file_path, audio_key):
+    """Wait for the prosody stage (or run it now if it wasn't started); unsupported audio formats just yield no prosody"""
+    try:
+        if prosody_future is None:
+            return analyze_prosody_cached(file_path, audio_key)
+        return prosody_future.result()
+    except Exception as e:
+        logger.warning(f"Prosody analysis failed: {str(e)}")
+        return None
+
+
+def request_executor():
+    """Stage pool for this request; profiled requests run every stage in the handler thread so the profile sees it"""
+    return None if is_profiling() else stage_executor
+
+
+def timings_requested():
+    return DEBUG_TIMINGS or request.args.get("debug") == "timings"
+
 
 @app.route("/analyze", methods=["POST"])
+@profiled
 def analyze_sentiment():
+    request_start = time.perf_counter()
     try:
         data = request.get_json()
 
@@ -26,24 +67,19 @@ def analyze_sentiment():
 
         user_text = data["text"]
 
-        # Run sentiment analysis
-        vader_result = analyze_with_vader(user_text)
-        roberta_result = analyze_with_roberta(user_text)
-
-        # Generate AI-powered therapist response
-        response = generate_response(
-            vader_result,
-            roberta_result,
-            user_text
-        )
-
-        return jsonify({
-            "text": user_text,
-            "vader_result": vader_result,
-            "roberta_result": roberta_result,
-            "response": response,
-            "overall_sentiment": (vader_result + roberta_result) / 2
-        })
+        try:
+            fields = parse_fields(data.get("fields"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Sentiment runs on the stage pool alongside contextual matching, and only when the reply or the client needs it
+        # (the session's mood trajectory is updated when the client sends a session ID)
+        session_id = data.get("session_id")
+        pipeline = AnalysisPipeline(user_text, executor=request_executor(), started=request_start)
+        result = pipeline.to_result("text", fields, timings=timings_requested(),
+                                    session_id=str(session_id) if session_id else None)
+
+        return jsonify(result)
 
     except Exception as e:
         logger.error(f"Error in analyze_sentiment: {str(e)}")
@@ -51,7 +87,10 @@ def analyze_sentiment():
 
 
 @app.route("/analyze-audio", methods=["POST"])
+@profiled
 def analyze_audio():
+    request_start = time.perf_counter()
+    file_path = None
     try:
         if "file" not in request.files:
             return jsonify({"error": "Missing audio file"}), 400
@@ -61,54 +100,122 @@ def analyze_audio():
         if file.filename == "":
             return jsonify({"error": "Empty filename"}), 400
 
-        # Save file temporarily
-        file_path = "temp_audio.wav"
+        try:
+            fields = parse_fields(request.form.get("fields"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Save file temporarily (unique per request so concurrent uploads don't clash)
+        fd, file_path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
         file.save(file_path)
 
+        # Prosody/fluency metrics run concurrently with transcription; both are cached by audio content
+        audio_key = hash_audio_file(file_path)
+        executor = request_executor()
+        prosody_future = executor.submit(analyze_prosody_cached, file_path, audio_key) if executor else None
+
         # Transcribe speech to text
-        text = transcribe_audio(file_path)
+        transcription_start = time.perf_counter()
+        try:
+            text = transcribe_audio_cached(file_path, audio_key)
+            transcription_ms = (time.perf_counter() - transcription_start) * 1000
+        finally:
+            # The prosody stage reads the file, so it must finish before the file is deleted
+            prosody = collect_prosody(prosody_future, file_path, audio_key)
         
         if not text or text.strip() == "":
+            os.remove(file_path)
             return jsonify({"error": "Could not transcribe audio to text"}), 400
 
-        # Run sentiment analysis
-        vader_result = analyze_with_vader(text)
-        roberta_result = analyze_with_roberta(text)
-
-        # Generate AI-powered therapist response
-        response = generate_response(
-            vader_result,
-            roberta_result,
-            text
-        )
-
         # Delete temp file
         if os.path.exists(file_path):
             os.remove(file_path)
 
-        return jsonify({
-            "transcribed_text": text,
-            "vader_result": vader_result,
-            "roberta_result": roberta_result,
-            "response": response,
-            "overall_sentiment": (vader_result + roberta_result) / 2
-        })
+        # Sentiment runs on the stage pool alongside contextual matching, and only when the reply or the client needs it
+        pipeline = AnalysisPipeline(text, executor=executor, started=request_start)
+        pipeline.timings["transcription"] = transcription_ms
+        result = audio_result(pipeline, prosody, fields, timings=timings_requested(),
+                              session_id=request.form.get("session_id") or None)
+
+        return jsonify(result)
 
     except Exception as e:
         logger.error(f"Error in analyze_audio: {str(e)}")
         # Clean up temp file if it exists
-        file_path = "temp_audio.wav"
-        if os.path.exists(file_path):
+        if file_path and os.path.exists(file_path):
             os.remove(file_path)
         return jsonify({"error": "Internal server error"}), 500
 
 
+@app.route("/analyze-audio/jobs", methods=["POST"])
+def submit_audio_job():
+    """Queue an audio file for analysis and return a job ID to poll"""
+    try:
+        if "file" not in request.files:
+            return jsonify({"error": "Missing audio file"}), 400
+
+        file = request.files["file"]
+
+        if file.filename == "":
+            return jsonify({"error": "Empty filename"}), 400
+
+        try:
+            fields = parse_fields(request.form.get("fields", "all"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        job = submit_job(file, fields=fields, session_id=request.form.get("session_id") or None)
+        return jsonify({"job_id": job["id"], "status": job["status"]}), 202
+
+    except Exception as e:
+        logger.error(f"Error in submit_audio_job: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route("/analyze-audio/jobs/<job_id>", methods=["GET"])
+def audio_job_status(job_id):
+    """Status of a queued audio analysis job, with the result once it is done"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@app.route("/sessions/<session_id>/trajectory", methods=["GET"])
+def session_trajectory(session_id):
+    """Rolling mood statistics for a session"""
+    trajectory = get_session_trajectory(session_id)
+    if trajectory is None:
+        return jsonify({"error": "Session not found"}), 404
+    return jsonify(trajectory)
+
+
 @app.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
     return jsonify({"status": "healthy", "message": "AI Speech Therapy Backend is running"})
 
 
+@app.route("/generation-stats", methods=["GET"])
+def generation_stats():
+    """Per-category acceptance statistics for AI generation"""
+    return jsonify(get_generation_stats())
+
+
+@app.route("/profiles", methods=["GET"])
+def profiles():
+    """List recently captured request profiles"""
+    limit = request.args.get("limit", 20, type=int)
+    return jsonify({"profiles": list_profiles(limit)})
+
+
+@app.route("/models", methods=["GET"])
+def models():
+    """Loaded models, their memory footprint and idle time"""
+    return jsonify(get_registry_status())
+
+
 if __name__ == "__main__":
     logger.info("Starting AI Speech Therapy Backend...")
     app.run(debug=False, host="0.0.0.0", port=5001)  # Disabled debug mode for production
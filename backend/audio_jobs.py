@@ -0,0 +1,173 @@
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+
+from transcription_cache import transcribe_audio_cached, hash_audio_file
+from analysis_pipeline import AnalysisPipeline, SENTIMENT_FIELDS, audio_result
+from prosody import analyze_prosody_cached
+
+# Jobs (uploaded audio + status file) are stored here so they survive restarts
+JOB_DIR = os.environ.get('JOB_QUEUE_DIR', 'audio_jobs')
+
+# Number of worker threads processing jobs
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+
+# Per-stage concurrency limits across all workers
+STAGE_LIMITS = {
+    'transcription': int(os.environ.get('JOB_TRANSCRIPTION_CONCURRENCY', '2')),
+    'sentiment': int(os.environ.get('JOB_SENTIMENT_CONCURRENCY', '2')),
+    'generation': int(os.environ.get('JOB_GENERATION_CONCURRENCY', '1'))
+}
+
+# Finished jobs older than this are deleted
+JOB_RETENTION_SECONDS = float(os.environ.get('JOB_RETENTION_SECONDS', str(24 * 3600)))
+
+# Job IDs are uuid4().hex; anything else is rejected before touching the filesystem
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+_stage_semaphores = {stage: threading.BoundedSemaphore(max(1, limit)) for stage, limit in STAGE_LIMITS.items()}
+_job_queue = queue.Queue()
+_status_lock = threading.Lock()
+_workers_started = False
+
+def _job_path(job_id, name):
+    return os.path.join(JOB_DIR, job_id, name)
+
+def _write_status(job_id, status):
+    """Atomically write a job's status file"""
+    tmp_path = _job_path(job_id, 'job.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(status, f)
+    os.replace(tmp_path, _job_path(job_id, 'job.json'))
+
+def _update_status(job_id, **changes):
+    with _status_lock:
+        status = get_job(job_id)
+        status.update(changes, updated=time.time())
+        _write_status(job_id, status)
+        return status
+
+def get_job(job_id):
+    """Return a job's status dict, or None if the job doesn't exist"""
+    # Job IDs are generated by us, reject anything that could escape the job directory
+    if not isinstance(job_id, str) or not JOB_ID_PATTERN.fullmatch(job_id):
+        return None
+    try:
+        with open(_job_path(job_id, 'job.json'), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def submit_job(file, fields=SENTIMENT_FIELDS, session_id=None):
+    """Store an uploaded audio file and queue it for analysis; returns the job status"""
+    _prune_jobs()
+    job_id = uuid.uuid4().hex
+    os.makedirs(os.path.join(JOB_DIR, job_id))
+    file.save(_job_path(job_id, 'audio.wav'))
+
+    now = time.time()
+    status = {
+        'id': job_id, 'status': 'queued', 'stage': None, 'result': None, 'error': None, 'created': now, 'updated': now,
+        'options': {'fields': list(fields), 'session_id': session_id}
+    }
+    with _status_lock:
+        _write_status(job_id, status)
+    _job_queue.put(job_id)
+    return status
+
+def _process_job(job_id):
+    """Run the full audio pipeline for one job, honouring the per-stage limits"""
+    file_path = _job_path(job_id, 'audio.wav')
+
+    # A job can be queued twice if it was submitted before the workers recovered it
+    status = get_job(job_id)
+    if status is None or status.get('status') in ('done', 'failed'):
+        return
+
+    options = status.get('options') or {}
+    # Jobs queued before options were stored computed every sentiment field
+    fields = tuple(options.get('fields', SENTIMENT_FIELDS))
+
+    _update_status(job_id, status='running', stage='transcription')
+    with _stage_semaphores['transcription']:
+        audio_key = hash_audio_file(file_path)
+        text = transcribe_audio_cached(file_path, audio_key)
+        try:
+            prosody = analyze_prosody_cached(file_path, audio_key)
+        except Exception:
+            # Unsupported audio formats just yield no prosody
+            prosody = None
+
+    if not text or text.strip() == "":
+        _update_status(job_id, status='failed', stage=None, error="Could not transcribe audio to text")
+        return
+
+    pipeline = AnalysisPipeline(text)
+    _update_status(job_id, stage='sentiment')
+    with _stage_semaphores['sentiment']:
+        pipeline.compute_fields(fields)
+
+    # Same result shape as /analyze-audio
+    _update_status(job_id, stage='generation')
+    with _stage_semaphores['generation']:
+        result = audio_result(pipeline, prosody, fields, session_id=options.get('session_id'))
+
+    _update_status(job_id, status='done', stage=None, result=result)
+
+    # The audio is no longer needed once the job is done
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+def _worker_loop():
+    while True:
+        job_id = _job_queue.get()
+        try:
+            _process_job(job_id)
+        except Exception as e:
+            try:
+                _update_status(job_id, status='failed', stage=None, error=f"Internal error: {e}")
+            except Exception:
+                pass
+        finally:
+            _job_queue.task_done()
+
+def _recover_jobs():
+    """Re-queue jobs that were queued or running when the process stopped"""
+    pending = []
+    for job_id in os.listdir(JOB_DIR):
+        status = get_job(job_id)
+        if status and status.get('status') in ('queued', 'running'):
+            pending.append((status.get('created', 0), job_id))
+
+    for _, job_id in sorted(pending):
+        _update_status(job_id, status='queued', stage=None)
+        _job_queue.put(job_id)
+
+def _prune_jobs():
+    """Delete finished jobs older than the retention period"""
+    if not os.path.isdir(JOB_DIR):
+        return
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    for job_id in os.listdir(JOB_DIR):
+        status = get_job(job_id)
+        if status and status.get('status') in ('done', 'failed') and status.get('updated', 0) < cutoff:
+            shutil.rmtree(os.path.join(JOB_DIR, job_id), ignore_errors=True)
+
+def start_job_workers():
+    """Start the worker pool and resume any unfinished jobs (safe to call more than once)"""
+    global _workers_started
+    if _workers_started:
+        return
+    _workers_started = True
+
+    os.makedirs(JOB_DIR, exist_ok=True)
+    _recover_jobs()
+    for i in range(max(1, JOB_WORKERS)):
+        threading.Thread(target=_worker_loop, name=f"audio-job-worker-{i}", daemon=True).start()
@@ -2,8 +2,14 @@ from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import torch
 import random
 import os
+import time
 import warnings
 
+from generation_stats import should_attempt_generation, record_generation_outcome
+from model_registry import register_model, use_model
+from reply_retrieval import retrieve_reply
+from torch_threads import torch_stage
+
 # Suppress warnings that can cause issues
 warnings.filterwarnings("ignore", message=".*tokenizers.*")
 warnings.filterwarnings("ignore", message=".*bitsandbytes.*")
@@ -14,110 +20,86 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 # Use Blenderbot-400M-distill for conversation (worked best before)
 BASE_MODEL = "facebook/blenderbot-400M-distill"
+RESPONSE_MODEL_NAME = "blenderbot"
 
-# Global variables to cache the model
-_cached_tokenizer = None
-_cached_model = None
-_cached_device = None
-_model_loading_failed = False
+# How to answer messages no contextual pattern matches: "generate" (Blenderbot) or
+# "retrieval" (pick the closest curated reply by embedding similarity, no generation)
+RESPONSE_MODE = os.environ.get('RESPONSE_MODE', 'generate').lower()
 
 # Check if we're in test mode (skip heavy model loading)
 def is_test_mode():
     return os.environ.get('TEST_MODE', 'false').lower() == 'true'
 
-def get_response_generator():
-    global _cached_tokenizer, _cached_model, _cached_device, _model_loading_failed
-    
-    # Return cached model if available
-    if _cached_tokenizer is not None and _cached_model is not None:
-        return _cached_tokenizer, _cached_model, _cached_device
-    
-    # If model loading previously failed, don't try again
-    if _model_loading_failed:
-        return None, None, None
+def _load_response_generator():
+    """Load Blenderbot-400M-distill (called by the model registry, possibly again after an idle unload)"""
+    # Load tokenizer
+    tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL)
+    # Ensure pad_token is set to eos_token if not already set
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    # Force CPU for reliable operation
+    device = "cpu"
+
+    # Load base model
+    model = AutoModelForSeq2SeqLM.from_pretrained(BASE_MODEL)
+
+    # Move model to device
+    model = model.to(device)
     
-    # Skip model loading in test mode
-    if is_test_mode():
-        # Test mode: Skipping heavy model loading
-        return None, None, None
+    model.eval()
     
-    try:
-        # Loading Blenderbot-400M-distill model...
-        
-        # Load tokenizer
-        tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL)
-        # Ensure pad_token is set to eos_token if not already set
-        if tokenizer.pad_token is None:
-            tokenizer.pad_token = tokenizer.eos_token
+    # Blenderbot-400M-distill model loaded successfully!
+    return tokenizer, model, device
 
-        # Force CPU for reliable operation
-        device = "cpu"
-        torch_dtype = torch.float32
+# The registry caches the model and may unload it when idle or over the memory budget
+register_model(RESPONSE_MODEL_NAME, _load_response_generator)
 
-        # Load base model
-        model = AutoModelForSeq2SeqLM.from_pretrained(BASE_MODEL)
+# Fallback responses with personalization
+POSITIVE_RESPONSES = [
+    "That's wonderful to hear about {topic}! What do you think contributed to this positive shift?",
+    "I'm really proud of your progress with {topic}. What would you like to build on from here?",
+    "You're doing a fantastic job with {topic}. What does this success tell you about your capabilities?",
+    "It sounds like you're in a good place with {topic} {time_context}. Is there anything specific you'd like to explore?",
+    "That's a significant achievement with {topic}! What did you learn about yourself through this process?"
+]
 
-        # Move model to device
-        model = model.to(device)
-        
-        model.eval()
-        
-        # Cache the model
-        _cached_tokenizer = tokenizer
-        _cached_model = model
-        _cached_device = device
-        
-        # Blenderbot-400M-distill model loaded successfully!
-        return tokenizer, model, device
-        
-    except Exception as e:
-        # Error loading Blenderbot-400M-distill model: {e}
-        # Will use fallback responses only
-        _model_loading_failed = True
-        return None, None, None
+NEUTRAL_RESPONSES = [
+    "Thanks for sharing that with me about {topic}. What's been on your mind lately?",
+    "Sometimes our feelings about {topic} aren't always clear. What do you think might be contributing to {emotion} right now?",
+    "I'm here for you with {topic}. What would be most helpful for us to focus on today?",
+    "Can you tell me more about {topic}? What else comes to mind when you think about this?",
+    "Let's explore {topic} together. What aspects of this feel most important to you right now?"
+]
+
+NEGATIVE_RESPONSES = [
+    "I hear how difficult {topic} is for you. What's been most challenging about this situation?",
+    "That sounds really tough with {topic}. Can you tell me more about what's contributing to {emotion}?",
+    "It's okay to feel like this about {topic}. What do you think these emotions might be trying to communicate?",
+    "Thanks for being open about {topic}. What would feel most supportive to you right now?",
+    "I'm really sorry you're going through this with {topic}. What's one small thing we could do together to help you feel a bit more supported?"
+]
+
+def render_positive_response(template, details):
+    return template.format(topic=details.get('topic', 'this'), time_context=details.get('time', 'recently'))
+
+def render_neutral_response(template, details):
+    return template.format(topic=details.get('topic', 'this situation'), emotion=details.get('emotion', 'how you\'re feeling'))
+
+def render_negative_response(template, details):
+    return template.format(topic=details.get('topic', 'this situation'), emotion=details.get('emotion', 'these feelings'))
 
-# Fallback responses with personalization
 def get_positive_response(details):
     """Get personalized positive response based on user details"""
-    topic = details.get('topic', 'this')
-    time_context = details.get('time', 'recently')
-    
-    responses = [
-        f"That's wonderful to hear about {topic}! What do you think contributed to this positive shift?",
-        f"I'm really proud of your progress with {topic}. What would you like to build on from here?",
-        f"You're doing a fantastic job with {topic}. What does this success tell you about your capabilities?",
-        f"It sounds like you're in a good place with {topic} {time_context}. Is there anything specific you'd like to explore?",
-        f"That's a significant achievement with {topic}! What did you learn about yourself through this process?"
-    ]
-    return random.choice(responses)
+    return render_positive_response(random.choice(POSITIVE_RESPONSES), details)
 
 def get_neutral_response(details):
     """Get personalized neutral response based on user details"""
-    topic = details.get('topic', 'this situation')
-    emotion = details.get('emotion', 'how you\'re feeling')
-    
-    responses = [
-        f"Thanks for sharing that with me about {topic}. What's been on your mind lately?",
-        f"Sometimes our feelings about {topic} aren't always clear. What do you think might be contributing to {emotion} right now?",
-        f"I'm here for you with {topic}. What would be most helpful for us to focus on today?",
-        f"Can you tell me more about {topic}? What else comes to mind when you think about this?",
-        f"Let's explore {topic} together. What aspects of this feel most important to you right now?"
-    ]
-    return random.choice(responses)
+    return render_neutral_response(random.choice(NEUTRAL_RESPONSES), details)
 
 def get_negative_response(details):
     """Get personalized negative response based on user details"""
-    topic = details.get('topic', 'this situation')
-    emotion = details.get('emotion', 'these feelings')
-    
-    responses = [
-        f"I hear how difficult {topic} is for you. What's been most challenging about this situation?",
-        f"That sounds really tough with {topic}. Can you tell me more about what's contributing to {emotion}?",
-        f"It's okay to feel like this about {topic}. What do you think these emotions might be trying to communicate?",
-        f"Thanks for being open about {topic}. What would feel most supportive to you right now?",
-        f"I'm really sorry you're going through this with {topic}. What's one small thing we could do together to help you feel a bit more supported?"
-    ]
-    return random.choice(responses)
+    return render_negative_response(random.choice(NEGATIVE_RESPONSES), details)
 
 # Specific responses for common requests
 RELAXATION_TECHNIQUES = [
@@ -192,34 +174,39 @@ def filter_problematic_response(response):
     
     return response
 
+def get_prompt_category(user_text):
+    """Pick the prompt category (CRISIS, NEGATIVE, ...) and its context line for the AI prompt"""
+    user_text_lower = user_text.lower()
+
+    # Detect specific emotional states and content (simplified)
+    if any(word in user_text_lower for word in ['kill', 'suicide', 'die', 'death', 'end it']):
+        # Crisis situation
+        return "CRISIS", "CRISIS: Someone is expressing thoughts of self-harm. Respond with immediate empathy, validation, and support. Acknowledge their pain and offer a safe space to talk."
+    elif any(word in user_text_lower for word in ['sad', 'depressed', 'lonely', 'hurt', 'pain', 'crying']):
+        # Negative emotions
+        return "NEGATIVE", "NEGATIVE: Someone is feeling sad or in emotional pain. Respond with deep empathy, validation, and gentle support. Acknowledge their feelings as valid."
+    elif any(word in user_text_lower for word in ['happy', 'excited', 'joy', 'great', 'wonderful', 'amazing', 'love']):
+        # Positive emotions
+        return "POSITIVE", "POSITIVE: Someone is feeling happy or joyful. Celebrate their positive feelings, validate their happiness, and encourage them to share more about what's bringing them joy."
+    elif any(word in user_text_lower for word in ['angry', 'frustrated', 'mad', 'hate', 'upset', 'annoyed']):
+        # Anger/frustration
+        return "ANGER", "ANGER: Someone is feeling angry or frustrated. Acknowledge their feelings as valid, help them feel heard, and offer support without trying to fix the situation."
+    elif any(word in user_text_lower for word in ['anxious', 'worried', 'scared', 'fear', 'nervous', 'stress']):
+        # Anxiety/worry
+        return "ANXIETY", "ANXIETY: Someone is feeling anxious or worried. Provide gentle reassurance, validate their concerns, and offer support without minimizing their feelings."
+    elif any(word in user_text_lower for word in ['gay', 'lesbian', 'bisexual', 'trans', 'lgbt', 'queer']):
+        # Identity-related
+        return "IDENTITY", "IDENTITY: Someone is sharing something about their identity. Respond with support, validation, and acceptance. Celebrate their courage in sharing."
+
+    # General sharing
+    return "GENERAL", "GENERAL: Someone is sharing their thoughts or feelings. Respond with empathy, curiosity, and gentle encouragement to help them explore further."
+
 def generate_ai_response(user_text, tokenizer, model, device):
-    """Generate a therapy-specific response using Blenderbot-400M-distill with excellent prompt engineering."""
+    """Generate a therapy-specific response using Blenderbot-400M-distill with excellent prompt engineering.
+    Returns (response, filtered_out); response is None both on errors and when the filter rejected the reply."""
     try:
         # Analyze sentiment and content for context-aware prompting
-        user_text_lower = user_text.lower()
-        
-        # Detect specific emotional states and content (simplified)
-        if any(word in user_text_lower for word in ['kill', 'suicide', 'die', 'death', 'end it']):
-            # Crisis situation
-            context = "CRISIS: Someone is expressing thoughts of self-harm. Respond with immediate empathy, validation, and support. Acknowledge their pain and offer a safe space to talk."
-        elif any(word in user_text_lower for word in ['sad', 'depressed', 'lonely', 'hurt', 'pain', 'crying']):
-            # Negative emotions
-            context = "NEGATIVE: Someone is feeling sad or in emotional pain. Respond with deep empathy, validation, and gentle support. Acknowledge their feelings as valid."
-        elif any(word in user_text_lower for word in ['happy', 'excited', 'joy', 'great', 'wonderful', 'amazing', 'love']):
-            # Positive emotions
-            context = "POSITIVE: Someone is feeling happy or joyful. Celebrate their positive feelings, validate their happiness, and encourage them to share more about what's bringing them joy."
-        elif any(word in user_text_lower for word in ['angry', 'frustrated', 'mad', 'hate', 'upset', 'annoyed']):
-            # Anger/frustration
-            context = "ANGER: Someone is feeling angry or frustrated. Acknowledge their feelings as valid, help them feel heard, and offer support without trying to fix the situation."
-        elif any(word in user_text_lower for word in ['anxious', 'worried', 'scared', 'fear', 'nervous', 'stress']):
-            # Anxiety/worry
-            context = "ANXIETY: Someone is feeling anxious or worried. Provide gentle reassurance, validate their concerns, and offer support without minimizing their feelings."
-        elif any(word in user_text_lower for word in ['gay', 'lesbian', 'bisexual', 'trans', 'lgbt', 'queer']):
-            # Identity-related
-            context = "IDENTITY: Someone is sharing something about their identity. Respond with support, validation, and acceptance. Celebrate their courage in sharing."
-        else:
-            # General sharing
-            context = "GENERAL: Someone is sharing their thoughts or feelings. Respond with empathy, curiosity, and gentle encouragement to help them explore further."
+        _, context = get_prompt_category(user_text)
         
         # Create a simplified but effective prompt
         prompt = (
@@ -232,7 +219,7 @@ def generate_ai_response(user_text, tokenizer, model, device):
         inputs = tokenizer([prompt], return_tensors='pt', padding=True, truncation=True, max_length=128)
         inputs = {k: v.to(device) for k, v in inputs.items()}
         # About to generate response with Blenderbot-400M-distill...
-        with torch.no_grad():
+        with torch_stage(), torch.no_grad():
             output_ids = model.generate(
                 **inputs,
                 max_new_tokens=64,
@@ -254,13 +241,13 @@ def generate_ai_response(user_text, tokenizer, model, device):
         # Filter out problematic responses
         filtered_response = filter_problematic_response(response)
         if filtered_response:
-            return filtered_response.strip()
+            return filtered_response.strip(), False
         else:
             # Response filtered out due to problematic content
-            return None
+            return None, True
     except Exception as e:
         # Error generating Blenderbot-400M-distill response: {e}
-        return None
+        return None, False
 
 def score_response_quality(response, sentiment_score):
     """Score the quality of a response for therapist-like characteristics"""
@@ -458,152 +445,245 @@ def extract_user_details(user_text):
     
     return details
 
+def is_crisis(user_text):
+    """Check for crisis/suicide phrases (the crisis reply needs no other analysis)"""
+    user_text_lower = user_text.lower()
+    return any(word in user_text_lower for word in ['kill myself', 'suicide', 'want to die', 'end it all', 'no reason to live'])
+
+# Contextual reply templates, keyed by the pattern that selects them
+CRISIS_RESPONSE = "I hear how much pain you're in right now. You're not alone, and I'm here to listen. Can you tell me more about what's bringing you to this place? Your feelings are valid, and there are people who want to help you through this."
+
+CONTEXTUAL_RESPONSES = {
+    'job market': "I understand how stressful the job market can be right now. It's such an uncertain and competitive environment, and it's completely normal to feel overwhelmed by it. What specifically about the job market is most concerning for you? Are you looking for work, or worried about job security?",
+    'work stress': "Work stress can be incredibly draining, especially when it feels like it's building up {time_context}. It affects not just your professional life but your personal well-being too. What's been most challenging about your work situation {time_context}?",
+    'workplace conflict': "Workplace conflicts can be so stressful - they can make going to work feel like walking into a minefield. Whether it's with your boss or colleagues, these situations can really impact your mental health. What's been happening that's been so difficult?",
+    'academic pressure': "Academic pressure can be intense, especially when it feels like your entire future depends on your performance. Exams and tests can trigger so much anxiety and self-doubt. What's been most stressful about your academic situation lately?",
+    'academic workload': "The workload in school can feel absolutely overwhelming - it's like there's always another assignment, another deadline, another expectation. It can feel impossible to keep up. What's been most challenging about managing your academic workload?",
+    'parent relationships': "Relationships with parents can be so complex - they can be our greatest source of love and support, but also our deepest wounds. What's been happening with your parents that's been affecting you? Family dynamics can be really challenging to navigate.",
+    'sibling relationships': "Sibling relationships can be incredibly complicated - there's so much history, competition, and love all mixed together. What's been happening with your siblings that's been difficult for you?",
+    'relationship ending': "The end of a relationship can feel like losing a part of yourself. It's normal to feel a mix of emotions - grief, anger, confusion, even relief. Breakups and divorces are major life transitions. How are you coping with this change?",
+    'stress': "I can hear how stressed you're feeling about {topic}. Stress can be so overwhelming - it affects your sleep, your mood, your ability to think clearly. What's been most stressful about {topic} for you?",
+    'anxiety': "Anxiety about {topic} can be so overwhelming - it's like your mind and body are constantly on high alert. What's been most anxiety-provoking about {topic} recently? I'm here to listen without judgment.",
+    'depression': "Depression can feel incredibly isolating and overwhelming {time_context}. It's not just feeling sad - it's a real struggle that affects every part of your life. What's been most difficult about this for you {time_context}?",
+    'loneliness': "Feeling lonely {time_context} can be one of the most painful experiences. It's not just about being physically alone - it's feeling disconnected from others. What does loneliness feel like for you right now?",
+    'anger': "Anger about {topic} is a powerful emotion that can feel overwhelming. It's often covering up other feelings like hurt, fear, or frustration. What's been triggering these angry feelings for you?",
+    'happiness': "It's wonderful to hear you're feeling happy about {topic}! Positive emotions are just as important to acknowledge as difficult ones. What's been bringing you this happiness? I'd love to hear more about it.",
+    'self-worth': "Those feelings of not being good enough about {topic} can be so painful and persistent. It's like having a harsh critic living inside your head. Where do you think these beliefs about yourself come from?",
+    'identity': "Sharing your identity can be both liberating and scary. It takes real courage to be authentic about who you are. How are you feeling about this aspect of yourself? Your identity is valid and worthy of celebration.",
+    'sleep': "Sleep problems related to {topic} can affect every aspect of your life - your mood, energy, concentration, even your physical health. What's been interfering with your sleep lately?",
+    'financial stress': "Financial stress about {topic} can be incredibly overwhelming - it affects your sense of security and can impact every area of your life. What's been most concerning about {topic}?",
+    'social anxiety': "{topic_capitalized} can feel so overwhelming when you're dealing with anxiety. It's like your mind is constantly scanning for threats. What makes {topic} most challenging for you?",
+    'perfectionism': "Perfectionism about {topic} can be so exhausting - it's like having impossible standards that you can never quite meet. What would it feel like to give yourself permission to be human and make mistakes?"
+}
+
+# Default topic used by each contextual template when the user didn't mention one
+CONTEXTUAL_TOPIC_DEFAULTS = {
+    'happiness': 'this',
+    'financial stress': 'your financial situation',
+    'social anxiety': 'social situations'
+}
+
+def render_contextual_response(key, details):
+    """Fill a contextual template with the user's details"""
+    topic = details.get('topic', CONTEXTUAL_TOPIC_DEFAULTS.get(key, 'this situation'))
+    time_context = "lately" if details.get('time') == 'recent' else "recently"
+    return CONTEXTUAL_RESPONSES[key].format(topic=topic, topic_capitalized=topic.capitalize(), time_context=time_context)
+
 def get_contextual_response(user_text):
     """Get specific, contextual responses based on user input patterns with personalization"""
+    # Crisis/Suicide responses (checked first so this path stays as fast as possible)
+    if is_crisis(user_text):
+        return CRISIS_RESPONSE
+    
     user_text_lower = user_text.lower()
     details = extract_user_details(user_text)
     
-    # Crisis/Suicide responses
-    if any(word in user_text_lower for word in ['kill myself', 'suicide', 'want to die', 'end it all', 'no reason to live']):
-        return "I hear how much pain you're in right now. You're not alone, and I'm here to listen. Can you tell me more about what's bringing you to this place? Your feelings are valid, and there are people who want to help you through this."
-    
-    # Job/Work stress with personalization
-    if details.get('topic') == 'job market':
-        return f"I understand how stressful the job market can be right now. It's such an uncertain and competitive environment, and it's completely normal to feel overwhelmed by it. What specifically about the job market is most concerning for you? Are you looking for work, or worried about job security?"
-    
-    if details.get('topic') == 'work stress':
-        time_context = "lately" if details.get('time') == 'recent' else "recently"
-        return f"Work stress can be incredibly draining, especially when it feels like it's building up {time_context}. It affects not just your professional life but your personal well-being too. What's been most challenging about your work situation {time_context}?"
-    
-    if details.get('topic') == 'workplace conflict':
-        return "Workplace conflicts can be so stressful - they can make going to work feel like walking into a minefield. Whether it's with your boss or colleagues, these situations can really impact your mental health. What's been happening that's been so difficult?"
-    
-    # Academic stress with personalization
-    if details.get('topic') == 'academic pressure':
-        return "Academic pressure can be intense, especially when it feels like your entire future depends on your performance. Exams and tests can trigger so much anxiety and self-doubt. What's been most stressful about your academic situation lately?"
-    
-    if details.get('topic') == 'academic workload':
-        return "The workload in school can feel absolutely overwhelming - it's like there's always another assignment, another deadline, another expectation. It can feel impossible to keep up. What's been most challenging about managing your academic workload?"
-    
-    # Family issues with personalization
-    if details.get('topic') == 'parent relationships':
-        return "Relationships with parents can be so complex - they can be our greatest source of love and support, but also our deepest wounds. What's been happening with your parents that's been affecting you? Family dynamics can be really challenging to navigate."
-    
-    if details.get('topic') == 'sibling relationships':
-        return "Sibling relationships can be incredibly complicated - there's so much history, competition, and love all mixed together. What's been happening with your siblings that's been difficult for you?"
-    
-    # Relationship issues with personalization
-    if details.get('topic') == 'relationship ending':
-        return "The end of a relationship can feel like losing a part of yourself. It's normal to feel a mix of emotions - grief, anger, confusion, even relief. Breakups and divorces are major life transitions. How are you coping with this change?"
+    # Job/Work stress, academic stress, family and relationship issues with personalization
+    for topic in ['job market', 'work stress', 'workplace conflict', 'academic pressure', 'academic workload',
+                  'parent relationships', 'sibling relationships', 'relationship ending']:
+        if details.get('topic') == topic:
+            return render_contextual_response(topic, details)
     
     # Specific emotions with context
-    if details.get('emotion') == 'stress':
-        topic = details.get('topic', 'this situation')
-        return f"I can hear how stressed you're feeling about {topic}. Stress can be so overwhelming - it affects your sleep, your mood, your ability to think clearly. What's been most stressful about {topic} for you?"
-    
-    if details.get('emotion') == 'anxiety':
-        topic = details.get('topic', 'this situation')
-        return f"Anxiety about {topic} can be so overwhelming - it's like your mind and body are constantly on high alert. What's been most anxiety-provoking about {topic} recently? I'm here to listen without judgment."
-    
-    if details.get('emotion') == 'depression':
-        time_context = "lately" if details.get('time') == 'recent' else "recently"
-        return f"Depression can feel incredibly isolating and overwhelming {time_context}. It's not just feeling sad - it's a real struggle that affects every part of your life. What's been most difficult about this for you {time_context}?"
-    
-    if details.get('emotion') == 'loneliness':
-        time_context = "lately" if details.get('time') == 'recent' else "recently"
-        return f"Feeling lonely {time_context} can be one of the most painful experiences. It's not just about being physically alone - it's feeling disconnected from others. What does loneliness feel like for you right now?"
-    
-    if details.get('emotion') == 'anger':
-        topic = details.get('topic', 'this situation')
-        return f"Anger about {topic} is a powerful emotion that can feel overwhelming. It's often covering up other feelings like hurt, fear, or frustration. What's been triggering these angry feelings for you?"
-    
-    if details.get('emotion') == 'happiness':
-        topic = details.get('topic', 'this')
-        return f"It's wonderful to hear you're feeling happy about {topic}! Positive emotions are just as important to acknowledge as difficult ones. What's been bringing you this happiness? I'd love to hear more about it."
+    for emotion in ['stress', 'anxiety', 'depression', 'loneliness', 'anger', 'happiness']:
+        if details.get('emotion') == emotion:
+            return render_contextual_response(emotion, details)
     
     # Identity and self-worth
     if any(word in user_text_lower for word in ['worthless', 'not good enough', 'failure', 'useless']):
-        context = details.get('topic', 'this situation')
-        return f"Those feelings of not being good enough about {context} can be so painful and persistent. It's like having a harsh critic living inside your head. Where do you think these beliefs about yourself come from?"
+        return render_contextual_response('self-worth', details)
     
     if any(word in user_text_lower for word in ['gay', 'lesbian', 'bisexual', 'trans', 'lgbt', 'queer', 'coming out']):
-        return "Sharing your identity can be both liberating and scary. It takes real courage to be authentic about who you are. How are you feeling about this aspect of yourself? Your identity is valid and worthy of celebration."
+        return render_contextual_response('identity', details)
     
     # Sleep issues
     if any(word in user_text_lower for word in ['sleep', 'insomnia', 'tired', 'exhausted']):
-        context = details.get('topic', 'this situation')
-        return f"Sleep problems related to {context} can affect every aspect of your life - your mood, energy, concentration, even your physical health. What's been interfering with your sleep lately?"
+        return render_contextual_response('sleep', details)
     
     # Financial stress
     if any(word in user_text_lower for word in ['money', 'financial', 'bills', 'debt', 'poor']):
-        context = details.get('topic', 'your financial situation')
-        return f"Financial stress about {context} can be incredibly overwhelming - it affects your sense of security and can impact every area of your life. What's been most concerning about {context}?"
+        return render_contextual_response('financial stress', details)
     
     # Social anxiety
     if any(word in user_text_lower for word in ['social anxiety', 'people', 'crowd', 'party', 'meeting']):
-        context = details.get('topic', 'social situations')
-        return f"{context.capitalize()} can feel so overwhelming when you're dealing with anxiety. It's like your mind is constantly scanning for threats. What makes {context} most challenging for you?"
+        return render_contextual_response('social anxiety', details)
     
     # Perfectionism
     if any(word in user_text_lower for word in ['perfect', 'perfectionist', 'mistake', 'failure']):
-        context = details.get('topic', 'this situation')
-        return f"Perfectionism about {context} can be so exhausting - it's like having impossible standards that you can never quite meet. What would it feel like to give yourself permission to be human and make mistakes?"
+        return render_contextual_response('perfectionism', details)
     
     # Return None if no specific pattern matches (will use sentiment-based fallback)
     return None
 
+# Curated replies retrieval can choose from (the crisis reply is never retrieved)
+CURATED_REPLY_BANK = (
+    [('contextual', key) for key in CONTEXTUAL_RESPONSES]
+    + [('positive', template) for template in POSITIVE_RESPONSES]
+    + [('neutral', template) for template in NEUTRAL_RESPONSES]
+    + [('negative', template) for template in NEGATIVE_RESPONSES]
+    + [('static', text) for text in RELAXATION_TECHNIQUES + COPING_STRATEGIES]
+)
+
+CURATED_REPLY_RENDERERS = {
+    'contextual': render_contextual_response,
+    'positive': render_positive_response,
+    'neutral': render_neutral_response,
+    'negative': render_negative_response,
+    'static': lambda text, details: text
+}
+
+def render_curated_reply(entry, details):
+    """Final wording of a curated reply for the user's details"""
+    kind, value = entry
+    return CURATED_REPLY_RENDERERS[kind](value, details)
+
+# Default wording of each curated reply; this is what gets embedded
+CURATED_REPLY_TEXTS = tuple(render_curated_reply(entry, {}) for entry in CURATED_REPLY_BANK)
+
+def sentiment_label(score):
+    """Bucket a sentiment score the way the fallback banks are chosen"""
+    if score > 0.3:
+        return 'positive'
+    if score < -0.3:
+        return 'negative'
+    return 'neutral'
+
+def _curated_reply_sentiments(entry):
+    """Message sentiments a curated reply may be retrieved for"""
+    kind, value = entry
+    if kind in ('positive', 'neutral', 'negative'):
+        return {kind}
+    if kind == 'contextual' and value == 'happiness':
+        return {'positive'}
+    if kind == 'contextual' and value != 'identity':
+        # The other contextual replies assume the user is struggling
+        return {'neutral', 'negative'}
+    return {'positive', 'neutral', 'negative'}
+
+# Positions retrieval may choose from for each message sentiment, so e.g. a negative
+# message can never be answered with "That's wonderful to hear..."
+CURATED_REPLY_CANDIDATES = {
+    label: [position for position, entry in enumerate(CURATED_REPLY_BANK) if label in _curated_reply_sentiments(entry)]
+    for label in ('positive', 'neutral', 'negative')
+}
+
 def generate_response(vader_score, roberta_score, user_text):
     """Generate a therapist-like response using contextual matching or fallback to predefined responses"""
-    
-    # Calculate overall sentiment score
-    overall_score = vader_score
-    
+    return generate_response_details(vader_score, roberta_score, user_text)['response']
+
+def generate_response_details(vader_score, roberta_score, user_text):
+    """Same as generate_response, but also report which path produced the reply and per-stage timings (ms)"""
+    timings = {}
+
     # First, try to get a contextual response based on specific patterns
+    start = time.perf_counter()
     contextual_response = get_contextual_response(user_text)
+    timings['contextual'] = (time.perf_counter() - start) * 1000
     if contextual_response:
         # Using contextual response based on user input patterns
-        return contextual_response
+        return {'response': contextual_response, 'path': 'contextual', 'timings': timings}
     
-    # Try to get AI-generated response (only if contextual matching failed)
-    tokenizer, model, device = get_response_generator()
+    return generate_noncontextual_response_details(vader_score, user_text, timings)
+
+def generate_noncontextual_response_details(vader_score, user_text, timings=None):
+    """Response details for text that matched no contextual pattern (AI generation or retrieval, then keyword and sentiment fallbacks)"""
+    timings = timings if timings is not None else {}
+
+    def result(response, path):
+        return {'response': response, 'path': path, 'timings': timings}
+
+    # Calculate overall sentiment score
+    overall_score = vader_score
     
-    if tokenizer and model:
+    # Try to get AI-generated response (only if contextual matching failed
+    # and generation has a realistic chance of being accepted for this category)
+    category, _ = get_prompt_category(user_text)
+    if RESPONSE_MODE == 'retrieval' and not is_test_mode():
+        # Nearest curated reply instead of generation; keyword and sentiment fallbacks still apply on a miss
+        start = time.perf_counter()
         try:
-            ai_response = generate_ai_response(user_text, tokenizer, model, device)
-            if ai_response:
-                # Score the AI response
-                quality_score = score_response_quality(ai_response, overall_score)
-                # Score the AI response
-                quality_score = score_response_quality(ai_response, overall_score)
-                
-                # Use AI response only if it meets very high quality threshold
-                if quality_score >= 10:  # Much higher threshold
-                    return ai_response
-                else:
-                    pass  # Use fallback response
+            position, _ = retrieve_reply(user_text, CURATED_REPLY_TEXTS, CURATED_REPLY_CANDIDATES[sentiment_label(overall_score)])
         except Exception as e:
-            pass  # Use fallback response
-    
+            position = None  # Use fallback response
+        timings['retrieval'] = (time.perf_counter() - start) * 1000
+        if position is not None:
+            reply = render_curated_reply(CURATED_REPLY_BANK[position], extract_user_details(user_text))
+            return result(reply, 'retrieval')
+    elif should_attempt_generation(category) and not is_test_mode():
+        # Hold the model for the whole generation so it can't be unloaded mid-call
+        start = time.perf_counter()
+        with use_model(RESPONSE_MODEL_NAME) as bundle:
+            timings['model_load'] = (time.perf_counter() - start) * 1000
+            if bundle is not None:
+                tokenizer, model, device = bundle
+                ai_response = None
+                filtered_out = False
+                accepted = False
+                start = time.perf_counter()
+                try:
+                    ai_response, filtered_out = generate_ai_response(user_text, tokenizer, model, device)
+                    if ai_response:
+                        # Score the AI response
+                        quality_score = score_response_quality(ai_response, overall_score)
+                        
+                        # Use AI response only if it meets very high quality threshold
+                        accepted = quality_score >= 10  # Much higher threshold
+                except Exception as e:
+                    pass  # Use fallback response
+                timings['generation'] = (time.perf_counter() - start) * 1000
+                # Filter and quality rejections count; model errors say nothing about the category's acceptance rate
+                if ai_response or filtered_out:
+                    record_generation_outcome(category, accepted)
+                if accepted:
+                    return result(ai_response, 'ai')
+    
+    start = time.perf_counter()
     # Check for specific requests and provide targeted responses
     user_text_lower = user_text.lower()
     
     # Check for relaxation technique requests
     if any(keyword in user_text_lower for keyword in ['relax', 'relaxing', 'calm', 'stress', 'anxiety', 'breathing', 'meditation', 'technique']):
         # Using relaxation techniques response
-        return random.choice(RELAXATION_TECHNIQUES)
+        timings['fallback'] = (time.perf_counter() - start) * 1000
+        return result(random.choice(RELAXATION_TECHNIQUES), 'relaxation')
     
     # Check for coping strategy requests
     if any(keyword in user_text_lower for keyword in ['cope', 'coping', 'deal with', 'handle', 'manage', 'strategy', 'help me']):
         # Using coping strategies response
-        return random.choice(COPING_STRATEGIES)
+        timings['fallback'] = (time.perf_counter() - start) * 1000
+        return result(random.choice(COPING_STRATEGIES), 'coping')
     
     # Fallback to sentiment-based responses with personalization
     # Using enhanced fallback response
     details = extract_user_details(user_text)
     
-    if overall_score > 0.3:
-        return get_positive_response(details)
-    elif overall_score < -0.3:
-        return get_negative_response(details)
+    label = sentiment_label(overall_score)
+    if label == 'positive':
+        response = get_positive_response(details)
+    elif label == 'negative':
+        response = get_negative_response(details)
     else:
-        return get_neutral_response(details) 
\ No newline at end of file
+        response = get_neutral_response(details)
+    path = f'sentiment_{label}'
+    timings['fallback'] = (time.perf_counter() - start) * 1000
+    return result(response, path)
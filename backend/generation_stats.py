@@ -0,0 +1,114 @@
+import json
+import os
+import random
+import threading
+
+# Where the per-category acceptance statistics are persisted between restarts
+STATS_PATH = os.environ.get('GENERATION_STATS_PATH', 'generation_stats.json')
+
+# Fraction of requests that still try generation in a skipped category (keeps estimates fresh)
+EXPLORATION_RATE = float(os.environ.get('GENERATION_EXPLORATION_RATE', '0.1'))
+
+# Categories whose estimated acceptance rate falls below this are skipped
+MIN_ACCEPTANCE_RATE = float(os.environ.get('GENERATION_MIN_ACCEPTANCE_RATE', '0.05'))
+
+# Number of attempts a category needs before we trust its acceptance rate
+MIN_ATTEMPTS = int(os.environ.get('GENERATION_MIN_ATTEMPTS', '20'))
+
+# Weight older outcomes keep each time a new one is recorded (0.99 is roughly the last 100 attempts),
+# so exploration can re-enable a category after a prompt or model change
+STATS_DECAY = float(os.environ.get('GENERATION_STATS_DECAY', '0.99'))
+
+# Global statistics: {category: {"attempts": float, "accepted": float, "total_attempts": int}}
+# (attempts/accepted are exponentially decayed, total_attempts is the all-time count)
+_stats = None
+_stats_lock = threading.Lock()
+
+# When off, generation is always attempted and outcomes aren't recorded (used by offline replays)
+_adaptive = True
+
+def _load_stats():
+    """Load statistics from disk (called lazily under the lock)"""
+    global _stats
+    if _stats is not None:
+        return _stats
+
+    _stats = {}
+    try:
+        with open(STATS_PATH, 'r') as f:
+            data = json.load(f)
+        for category, counts in data.items():
+            _stats[category] = {
+                'attempts': float(counts.get('attempts', 0)),
+                'accepted': float(counts.get('accepted', 0)),
+                'total_attempts': int(counts.get('total_attempts', counts.get('attempts', 0)))
+            }
+    except (OSError, ValueError, AttributeError):
+        # Missing or unreadable stats file: start from scratch
+        pass
+    return _stats
+
+def _save_stats():
+    """Write statistics to disk atomically (called under the lock)"""
+    tmp_path = f"{STATS_PATH}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(_stats, f)
+        os.replace(tmp_path, STATS_PATH)
+    except OSError:
+        # Persisting is best effort; in-memory stats keep working
+        pass
+
+def get_acceptance_rate(category):
+    """Smoothed acceptance rate for a category (Laplace prior, 0.5 when unseen)"""
+    with _stats_lock:
+        counts = _load_stats().get(category, {'attempts': 0, 'accepted': 0})
+        return (counts['accepted'] + 1) / (counts['attempts'] + 2)
+
+def set_adaptive_generation(enabled):
+    """Turn adaptive skipping and outcome recording on or off for this process"""
+    global _adaptive
+    _adaptive = enabled
+
+def should_attempt_generation(category):
+    """Decide whether AI generation is worth running for this prompt category"""
+    if not _adaptive:
+        return True
+
+    with _stats_lock:
+        counts = _load_stats().get(category, {'attempts': 0, 'accepted': 0})
+
+    # Not enough evidence yet, keep generating
+    if counts['attempts'] < MIN_ATTEMPTS:
+        return True
+
+    if get_acceptance_rate(category) >= MIN_ACCEPTANCE_RATE:
+        return True
+
+    # Generation rarely wins here, only explore occasionally
+    return random.random() < EXPLORATION_RATE
+
+def record_generation_outcome(category, accepted):
+    """Record whether a generated response for this category was actually used"""
+    if not _adaptive:
+        return
+    with _stats_lock:
+        stats = _load_stats()
+        counts = stats.setdefault(category, {'attempts': 0.0, 'accepted': 0.0, 'total_attempts': 0})
+        counts['attempts'] = counts['attempts'] * STATS_DECAY + 1
+        counts['accepted'] = counts['accepted'] * STATS_DECAY + (1 if accepted else 0)
+        counts['total_attempts'] += 1
+        _save_stats()
+
+def get_generation_stats():
+    """Return a snapshot of the per-category statistics"""
+    with _stats_lock:
+        return {
+            category: {
+                'attempts': round(counts['attempts'], 2),
+                'accepted': round(counts['accepted'], 2),
+                'total_attempts': counts['total_attempts'],
+                'acceptance_rate': (counts['accepted'] + 1) / (counts['attempts'] + 2)
+            }
+            for category, counts in _load_stats().items()
+        }
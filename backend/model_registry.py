@@ -0,0 +1,221 @@
+import ctypes
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Total memory the registry may keep resident, in MB (0 disables the budget)
+MEMORY_BUDGET_MB = float(os.environ.get('MODEL_MEMORY_BUDGET_MB', '0'))
+
+# Unload models that haven't been used for this many seconds (0 disables idle unloading)
+IDLE_TIMEOUT = float(os.environ.get('MODEL_IDLE_TIMEOUT', '0'))
+
+# How often the background reaper checks for idle models
+REAPER_INTERVAL = float(os.environ.get('MODEL_REAPER_INTERVAL', '60'))
+
+# A model that loaded before but fails to reload (download hiccup, OOM, ...) is retried after this
+# many seconds, doubling with each consecutive failure up to the maximum
+RETRY_BACKOFF = float(os.environ.get('MODEL_RETRY_BACKOFF', '30'))
+RETRY_BACKOFF_MAX = float(os.environ.get('MODEL_RETRY_BACKOFF_MAX', '1800'))
+
+class _ModelEntry:
+    """Bookkeeping for one registered model"""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.value = None
+        self.loaded = False
+        self.failed = False
+        self.failures = 0
+        self.retry_at = 0.0
+        self.size_bytes = 0
+        # Process RSS growth while this model loaded; approximate when loads overlap on other threads
+        self.load_rss_growth_bytes = 0
+        self.last_used = 0.0
+        self.in_use = 0
+        self.load_count = 0
+        self.load_lock = threading.Lock()
+
+_models = {}
+_registry_lock = threading.Lock()
+_reaper_started = False
+
+def _current_rss():
+    """Resident set size of this process in bytes (0 if unavailable)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+def _estimate_size(value, seen=None):
+    """Estimate the memory held by a model from its parameters and buffers"""
+    seen = seen if seen is not None else set()
+    if value is None or id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, (tuple, list)):
+        return sum(_estimate_size(item, seen) for item in value)
+
+    size = 0
+    if hasattr(value, 'parameters') and hasattr(value, 'buffers'):
+        for tensor in list(value.parameters()) + list(value.buffers()):
+            size += tensor.numel() * tensor.element_size()
+    elif hasattr(value, 'model'):
+        # Hugging Face pipelines wrap the actual model
+        size += _estimate_size(value.model, seen)
+    return size
+
+def _release_memory():
+    """Collect garbage and hand freed heap pages back to the OS where possible"""
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+def _resident_bytes(entry):
+    return max(entry.size_bytes, entry.load_rss_growth_bytes)
+
+def _make_room(needed_bytes, exclude):
+    """Unload least recently used idle models until needed_bytes fits in the budget"""
+    if MEMORY_BUDGET_MB <= 0:
+        return
+
+    budget = MEMORY_BUDGET_MB * 1024 * 1024
+    with _registry_lock:
+        loaded = [entry for entry in _models.values() if entry.loaded]
+        total = sum(_resident_bytes(entry) for entry in loaded)
+        candidates = sorted(
+            (entry for entry in loaded if entry.name != exclude and entry.in_use == 0),
+            key=lambda entry: entry.last_used
+        )
+
+    for entry in candidates:
+        if total + needed_bytes <= budget:
+            break
+        freed = _resident_bytes(entry)
+        if unload_model(entry.name):
+            total -= freed
+
+def _reaper_loop():
+    while True:
+        time.sleep(REAPER_INTERVAL)
+        unload_idle_models()
+
+def _start_reaper():
+    global _reaper_started
+    if _reaper_started or IDLE_TIMEOUT <= 0:
+        return
+    _reaper_started = True
+    threading.Thread(target=_reaper_loop, name="model-reaper", daemon=True).start()
+
+def register_model(name, loader):
+    """Register a model by name; loader() is called lazily and may be called again after unloading"""
+    with _registry_lock:
+        if name not in _models:
+            _models[name] = _ModelEntry(name, loader)
+    _start_reaper()
+
+def _load(entry):
+    """Load a model if needed, returning its value (None if loading failed)"""
+    with entry.load_lock:
+        if entry.loaded:
+            return entry.value
+        # A model that never loaded stays failed (callers use their fallbacks);
+        # one that failed to reload is retried once its backoff has passed
+        if entry.failed and (entry.load_count == 0 or time.time() < entry.retry_at):
+            return None
+
+        # Reuse the size from a previous load to evict before we allocate
+        _make_room(_resident_bytes(entry), exclude=entry.name)
+
+        rss_before = _current_rss()
+        try:
+            value = entry.loader()
+        except Exception:
+            entry.failed = True
+            entry.failures += 1
+            entry.retry_at = time.time() + min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** (entry.failures - 1))
+            return None
+
+        with _registry_lock:
+            entry.value = value
+            entry.loaded = True
+            entry.failed = False
+            entry.failures = 0
+            entry.load_count += 1
+            entry.size_bytes = _estimate_size(value)
+            entry.load_rss_growth_bytes = max(0, _current_rss() - rss_before)
+
+    # Now that the real size is known, evict others if we went over budget
+    # (outside the load lock so two concurrent loads can't wait on each other)
+    _make_room(0, exclude=entry.name)
+    return value
+
+@contextmanager
+def use_model(name):
+    """Context manager that keeps a model from being unloaded while it is in use"""
+    entry = _models[name]
+    with _registry_lock:
+        entry.in_use += 1
+    try:
+        value = _load(entry)
+        entry.last_used = time.time()
+        yield value
+    finally:
+        with _registry_lock:
+            entry.in_use -= 1
+            entry.last_used = time.time()
+
+def unload_model(name):
+    """Release a loaded model; returns False if it isn't loaded or is currently in use"""
+    entry = _models[name]
+    with entry.load_lock:
+        with _registry_lock:
+            if not entry.loaded or entry.in_use > 0:
+                return False
+            entry.value = None
+            entry.loaded = False
+    _release_memory()
+    return True
+
+def unload_idle_models():
+    """Unload every model that has been idle longer than IDLE_TIMEOUT"""
+    if IDLE_TIMEOUT <= 0:
+        return []
+
+    now = time.time()
+    with _registry_lock:
+        idle = [
+            entry.name for entry in _models.values()
+            if entry.loaded and entry.in_use == 0 and now - entry.last_used > IDLE_TIMEOUT
+        ]
+    return [name for name in idle if unload_model(name)]
+
+def get_registry_status():
+    """Per-model memory and usage information"""
+    now = time.time()
+    with _registry_lock:
+        models = {
+            entry.name: {
+                'loaded': entry.loaded,
+                'failed': entry.failed,
+                'retry_in_seconds': round(max(0.0, entry.retry_at - now), 1) if entry.failed and entry.load_count else None,
+                'size_bytes': entry.size_bytes,
+                'load_rss_growth_bytes': entry.load_rss_growth_bytes if entry.loaded else 0,
+                'in_use': entry.in_use,
+                'load_count': entry.load_count,
+                'idle_seconds': round(now - entry.last_used, 1) if entry.last_used else None
+            }
+            for entry in _models.values()
+        }
+    return {
+        'process_rss_bytes': _current_rss(),
+        'budget_bytes': int(MEMORY_BUDGET_MB * 1024 * 1024),
+        'idle_timeout_seconds': IDLE_TIMEOUT,
+        'models': models
+    }
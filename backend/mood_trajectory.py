@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from enhanced_response_generator import extract_user_details
+
+# Smoothing factor for the exponentially weighted mean (higher reacts faster)
+EWMA_ALPHA = float(os.environ.get('MOOD_EWMA_ALPHA', '0.3'))
+
+# Number of recent messages used for the windowed variance and trend slope
+WINDOW_SIZE = max(2, int(os.environ.get('MOOD_WINDOW', '20')))
+
+# Least recently updated sessions are dropped beyond this many
+MAX_SESSIONS = int(os.environ.get('MOOD_MAX_SESSIONS', '10000'))
+
+# Emotions reported by extract_user_details, plus a bucket for messages without one
+EMOTIONS = ['stress', 'anxiety', 'depression', 'anger', 'loneliness', 'happiness', 'shame', 'boredom', 'motivation', 'none']
+_EMOTION_INDEX = {emotion: i for i, emotion in enumerate(EMOTIONS)}
+
+class _SessionStats:
+    """Rolling mood statistics for one session, updated in O(1) per message"""
+
+    __slots__ = ('count', 'ewma', 'last', 'window', 'sum_y', 'sum_y2', 'sum_ty', 'emotion_counts', 'updated')
+
+    def __init__(self):
+        self.count = 0
+        self.ewma = 0.0
+        self.last = 0.0
+        # Ring buffer of the last WINDOW_SIZE scores; sample t lives at t % WINDOW_SIZE
+        self.window = array('d', bytes(8 * WINDOW_SIZE))
+        # Running sums over the window (t is the message index within the session)
+        self.sum_y = 0.0
+        self.sum_y2 = 0.0
+        self.sum_ty = 0.0
+        self.emotion_counts = array('I', bytes(4 * len(EMOTIONS)))
+        self.updated = 0.0
+
+    def add(self, score, emotion):
+        t = self.count
+        slot = t % WINDOW_SIZE
+
+        # Drop the sample falling out of the window
+        if t >= WINDOW_SIZE:
+            old = self.window[slot]
+            self.sum_y -= old
+            self.sum_y2 -= old * old
+            self.sum_ty -= (t - WINDOW_SIZE) * old
+
+        self.window[slot] = score
+        self.sum_y += score
+        self.sum_y2 += score * score
+        self.sum_ty += t * score
+
+        self.ewma = score if t == 0 else EWMA_ALPHA * score + (1 - EWMA_ALPHA) * self.ewma
+        self.last = score
+        self.count = t + 1
+        self.emotion_counts[_EMOTION_INDEX.get(emotion, _EMOTION_INDEX['none'])] += 1
+        self.updated = time.time()
+
+    def snapshot(self):
+        n = min(self.count, WINDOW_SIZE)
+        mean = self.sum_y / n if n else 0.0
+        variance = max(0.0, self.sum_y2 / n - mean * mean) if n else 0.0
+
+        # Least-squares slope over the window; indices run from first to first + n - 1
+        slope = 0.0
+        if n >= 2:
+            first = self.count - n
+            sum_t = n * first + n * (n - 1) / 2
+            sum_t2 = n * first * first + first * n * (n - 1) + (n - 1) * n * (2 * n - 1) / 6
+            denominator = n * sum_t2 - sum_t * sum_t
+            if denominator:
+                slope = (n * self.sum_ty - sum_t * self.sum_y) / denominator
+
+        return {
+            'messages': self.count,
+            'last_sentiment': self.last,
+            'ewma_sentiment': round(self.ewma, 4),
+            'window_size': n,
+            'window_mean': round(mean, 4),
+            'window_variance': round(variance, 4),
+            'trend_slope': round(slope, 4),
+            'emotion_counts': {emotion: count for emotion, count in zip(EMOTIONS, self.emotion_counts) if count},
+            'updated': self.updated
+        }
+
+_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+def record_mood(session_id, sentiment_score, user_text):
+    """Add one message to a session's trajectory and return the updated trajectory"""
+    emotion = extract_user_details(user_text).get('emotion', 'none')
+
+    with _sessions_lock:
+        stats = _sessions.get(session_id)
+        if stats is None:
+            stats = _sessions[session_id] = _SessionStats()
+            while len(_sessions) > MAX_SESSIONS:
+                _sessions.popitem(last=False)
+        else:
+            _sessions.move_to_end(session_id)
+        stats.add(float(sentiment_score), emotion)
+        return stats.snapshot()
+
+def get_session_trajectory(session_id):
+    """Return a session's rolling mood statistics, or None for unknown sessions"""
+    with _sessions_lock:
+        stats = _sessions.get(session_id)
+        return stats.snapshot() if stats is not None else None
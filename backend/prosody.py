@@ -0,0 +1,312 @@
+import copy
+import math
+import os
+import threading
+import wave
+from collections import OrderedDict
+
+import numpy as np
+
+# Analysis frame length; 40 ms holds at least two periods of the lowest pitch we look for
+FRAME_SECONDS = 0.04
+
+# Frames read from disk and processed together (memory is bounded by this, not by the recording)
+BLOCK_FRAMES = int(os.environ.get('PROSODY_BLOCK_FRAMES', '256'))
+
+# Silences shorter than this are treated as part of speech, not as pauses
+MIN_PAUSE_SECONDS = float(os.environ.get('PROSODY_MIN_PAUSE', '0.25'))
+
+# Syllable nuclei are peaks of the smoothed energy envelope that rise and fall by at least
+# this many dB and are at least this far apart
+SYLLABLE_PROMINENCE_DB = float(os.environ.get('PROSODY_SYLLABLE_PROMINENCE_DB', '3.0'))
+MIN_SYLLABLE_GAP_SECONDS = 0.1
+SMOOTHING_FRAMES = 3
+
+# Pitch search range and the autocorrelation strength needed to call a frame voiced
+PITCH_MIN_HZ = 75.0
+PITCH_MAX_HZ = 400.0
+VOICING_THRESHOLD = 0.3
+
+# Fixed histograms keep percentiles computable in constant memory
+ENERGY_BINS = np.linspace(-100.0, 0.0, 201)  # dBFS, 0.5 dB bins
+PITCH_BINS = PITCH_MIN_HZ * 2 ** (np.arange(0, 12 * math.log2(PITCH_MAX_HZ / PITCH_MIN_HZ) + 1.01, 0.5) / 12)  # half-semitone bins
+PAUSE_BUCKETS = [(0.25, 0.5), (0.5, 1.0), (1.0, 2.0), (2.0, None)]
+
+# Prosody results kept in memory, keyed by the same audio content hash as the transcription cache
+PROSODY_CACHE_SIZE = int(os.environ.get('PROSODY_CACHE_SIZE', '256'))
+
+_prosody_cache = OrderedDict()
+_prosody_cache_lock = threading.Lock()
+
+class _RunningStats:
+    """Running mean/variance, merged one block at a time (Chan et al.'s parallel update)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add_block(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        count = values.size
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+class _SyllableCounter:
+    """Counts prominent peaks of the smoothed energy envelope, one block at a time"""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.min_gap = max(1, math.ceil(MIN_SYLLABLE_GAP_SECONDS / FRAME_SECONDS - 1e-9))
+        self.count = 0
+        self.frame = 0
+        # Envelope smoothing carries the last raw frames over block boundaries
+        self.tail = np.full(SMOOTHING_FRAMES - 1, -100.0)
+        # Peak picking with hysteresis: rising towards a peak, or falling towards a valley
+        self.rising = True
+        self.valley = -100.0
+        self.peak = -100.0
+        self.peak_frame = 0
+        self.last_peak_frame = None
+
+    def _accept_peak(self):
+        if self.peak < self.threshold:
+            return
+        if self.last_peak_frame is not None and self.peak_frame - self.last_peak_frame < self.min_gap:
+            return
+        self.count += 1
+        self.last_peak_frame = self.peak_frame
+
+    def add_block(self, energy):
+        extended = np.concatenate([self.tail, energy])
+        smoothed = np.convolve(extended, np.ones(SMOOTHING_FRAMES) / SMOOTHING_FRAMES, mode='valid')
+        self.tail = extended[len(extended) - (SMOOTHING_FRAMES - 1):]
+
+        # Frames are 40 ms, so this loop runs 25 times per second of audio
+        for value in smoothed.tolist():
+            if self.rising:
+                if value > self.peak:
+                    self.peak, self.peak_frame = value, self.frame
+                elif self.peak - value >= SYLLABLE_PROMINENCE_DB:
+                    self._accept_peak()
+                    self.rising = False
+                    self.valley = value
+            elif value < self.valley:
+                self.valley = value
+            elif value - self.valley >= SYLLABLE_PROMINENCE_DB:
+                self.rising = True
+                self.peak, self.peak_frame = value, self.frame
+            self.frame += 1
+
+    def finish(self):
+        """Count a peak still rising when the recording ends (speech cut off mid-syllable)"""
+        if self.rising and self.peak - self.valley >= SYLLABLE_PROMINENCE_DB:
+            self._accept_peak()
+            self.rising = False
+        return self.count
+
+def _histogram_percentile(counts, edges, fraction):
+    """Approximate percentile from a fixed-bin histogram"""
+    total = counts.sum()
+    if total == 0:
+        return None
+    index = int(np.searchsorted(np.cumsum(counts), fraction * total))
+    index = min(index, len(counts) - 1)
+    return float((edges[index] + edges[index + 1]) / 2)
+
+def _read_blocks(file_path):
+    """Yield (frames, sample_rate) blocks of mono float audio, BLOCK_FRAMES analysis frames at a time"""
+    with wave.open(file_path, 'rb') as wav:
+        sample_rate = wav.getframerate()
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        frame_length = max(1, int(sample_rate * FRAME_SECONDS))
+
+        if width == 1:
+            dtype, offset, scale = np.uint8, 128.0, 128.0
+        elif width == 2:
+            dtype, offset, scale = np.int16, 0.0, 32768.0
+        elif width == 4:
+            dtype, offset, scale = np.int32, 0.0, 2147483648.0
+        else:
+            raise ValueError(f"Unsupported sample width: {width} bytes")
+
+        while True:
+            raw = wav.readframes(frame_length * BLOCK_FRAMES)
+            if not raw:
+                break
+            samples = (np.frombuffer(raw, dtype=dtype).astype(np.float32) - offset) / scale
+            samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+
+            # Drop the trailing partial frame (under 40 ms, too short to analyze)
+            usable = len(samples) - len(samples) % frame_length
+            if usable == 0:
+                break
+            yield samples[:usable].reshape(-1, frame_length), sample_rate
+
+def _frame_energy_db(frames):
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-5))
+
+def _frame_pitch(frames, sample_rate):
+    """Autocorrelation pitch per frame (NaN for unvoiced frames), computed for the whole block with one FFT"""
+    frame_length = frames.shape[1]
+    centered = frames - frames.mean(axis=1, keepdims=True)
+    spectrum = np.fft.rfft(centered, n=2 * frame_length, axis=1)
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum), axis=1)[:, :frame_length]
+
+    min_lag = max(1, int(sample_rate / PITCH_MAX_HZ))
+    max_lag = min(frame_length - 1, int(sample_rate / PITCH_MIN_HZ))
+    if max_lag <= min_lag:
+        return np.full(len(frames), np.nan)
+
+    lags = autocorr[:, min_lag:max_lag + 1]
+    best = np.argmax(lags, axis=1)
+    strength = lags[np.arange(len(frames)), best] / np.maximum(autocorr[:, 0], 1e-12)
+    pitch = sample_rate / (best + min_lag)
+    return np.where(strength >= VOICING_THRESHOLD, pitch, np.nan)
+
+def _speech_threshold(file_path):
+    """First pass: pick a speech/silence energy threshold from the energy distribution"""
+    counts = np.zeros(len(ENERGY_BINS) - 1, dtype=np.int64)
+    for frames, _ in _read_blocks(file_path):
+        counts += np.histogram(np.clip(_frame_energy_db(frames), -100.0, -1e-9), bins=ENERGY_BINS)[0]
+
+    noise_floor = _histogram_percentile(counts, ENERGY_BINS, 0.1)
+    peak = _histogram_percentile(counts, ENERGY_BINS, 0.95)
+    if noise_floor is None:
+        return None
+    # Halfway (in dB) between the noise floor and loud speech, but never below -50 dBFS
+    return max((noise_floor + peak) / 2, -50.0)
+
+def analyze_prosody(file_path):
+    """Speaking rate, pauses, energy variability and pitch range for a WAV file, in constant memory"""
+    threshold = _speech_threshold(file_path)
+    if threshold is None:
+        return None
+
+    total_frames = 0
+    speech_frames = 0
+    syllable_counter = _SyllableCounter(threshold)
+    energy_stats = _RunningStats()
+    pitch_counts = np.zeros(len(PITCH_BINS) - 1, dtype=np.int64)
+    pause_stats = _RunningStats()
+    pause_buckets = [0] * len(PAUSE_BUCKETS)
+    pause_max = 0.0
+
+    # State carried between blocks
+    silence_run = 0
+    seen_speech = False
+
+    for frames, sample_rate in _read_blocks(file_path):
+        energy = _frame_energy_db(frames)
+        speech = energy >= threshold
+        total_frames += len(frames)
+        speech_frames += int(speech.sum())
+
+        # Energy variability over speech frames only
+        energy_stats.add_block(energy[speech])
+
+        # Syllable nuclei: prominent, well-separated peaks of the smoothed envelope
+        syllable_counter.add_block(energy)
+
+        # Pitch over voiced speech frames
+        pitch = _frame_pitch(frames[speech], sample_rate) if speech.any() else np.empty(0)
+        pitch = pitch[~np.isnan(pitch)]
+        pitch_counts += np.histogram(pitch, bins=PITCH_BINS)[0]
+
+        # Pauses: runs of silence between speech; only the run boundaries need Python
+        changes = np.flatnonzero(np.diff(np.concatenate([[speech[0]], speech]).astype(np.int8)))
+        start = 0
+        for boundary in list(changes) + [len(speech)]:
+            if boundary == start:
+                continue
+            if speech[start]:
+                if seen_speech and silence_run:
+                    pause = silence_run * FRAME_SECONDS
+                    if pause >= MIN_PAUSE_SECONDS:
+                        pause_stats.add_block([pause])
+                        pause_max = max(pause_max, pause)
+                        for i, (low, high) in enumerate(PAUSE_BUCKETS):
+                            if pause >= low and (high is None or pause < high):
+                                pause_buckets[i] += 1
+                silence_run = 0
+                seen_speech = True
+            else:
+                silence_run += boundary - start
+            start = boundary
+
+    if total_frames == 0:
+        return None
+
+    syllables = syllable_counter.finish()
+    duration = total_frames * FRAME_SECONDS
+    speech_time = speech_frames * FRAME_SECONDS
+    pitch_low = _histogram_percentile(pitch_counts, PITCH_BINS, 0.05)
+    pitch_high = _histogram_percentile(pitch_counts, PITCH_BINS, 0.95)
+
+    return {
+        'duration_seconds': round(duration, 2),
+        'speech_seconds': round(speech_time, 2),
+        'syllables_estimate': syllables,
+        'speaking_rate_syllables_per_second': round(syllables / duration, 2) if duration else 0.0,
+        'articulation_rate_syllables_per_second': round(syllables / speech_time, 2) if speech_time else 0.0,
+        'pauses': {
+            'count': pause_stats.count,
+            'total_seconds': round(pause_stats.mean * pause_stats.count, 2),
+            'mean_seconds': round(pause_stats.mean, 2),
+            'std_seconds': round(pause_stats.std, 2),
+            'max_seconds': round(pause_max, 2),
+            'distribution': {
+                (f"{low}-{high}s" if high is not None else f"{low}s+"): count
+                for (low, high), count in zip(PAUSE_BUCKETS, pause_buckets)
+            }
+        },
+        'energy': {
+            'mean_db': round(energy_stats.mean, 2),
+            'std_db': round(energy_stats.std, 2)
+        },
+        'pitch': {
+            'min_hz': round(pitch_low, 1) if pitch_low else None,
+            'median_hz': round(_histogram_percentile(pitch_counts, PITCH_BINS, 0.5), 1) if pitch_low else None,
+            'max_hz': round(pitch_high, 1) if pitch_high else None,
+            'range_semitones': round(12 * math.log2(pitch_high / pitch_low), 1) if pitch_low else None
+        }
+    }
+
+def analyze_prosody_cached(file_path, key):
+    """analyze_prosody, reusing the result for audio with the same content hash"""
+    with _prosody_cache_lock:
+        if key in _prosody_cache:
+            _prosody_cache.move_to_end(key)
+            # Callers add transcript rates to the dict, so never hand out the cached one
+            return copy.deepcopy(_prosody_cache[key])
+
+    prosody = analyze_prosody(file_path)
+
+    with _prosody_cache_lock:
+        _prosody_cache[key] = prosody
+        _prosody_cache.move_to_end(key)
+        while len(_prosody_cache) > PROSODY_CACHE_SIZE:
+            _prosody_cache.popitem(last=False)
+    return copy.deepcopy(prosody)
+
+def add_transcript_rates(prosody, text):
+    """Add word-based rates once the transcript is known"""
+    words = len(text.split())
+    prosody['words'] = words
+    prosody['words_per_minute'] = round(words / prosody['duration_seconds'] * 60, 1) if prosody['duration_seconds'] else 0.0
+    prosody['articulation_words_per_minute'] = round(words / prosody['speech_seconds'] * 60, 1) if prosody['speech_seconds'] else 0.0
+    return prosody
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Offline replay harness.
+Runs a JSONL corpus of user messages through the same analysis pipeline
+as /analyze in-process, then reports which response path was used,
+per-stage latency and the difference against a saved baseline run.
+
+Usage:
+    python replay.py corpus.jsonl --workers 4 --output run.json --baseline baseline.json --no-adaptive-generation
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis_pipeline import AnalysisPipeline, SENTIMENT_FIELDS
+from sentiment_model import analyze_with_vader_batch
+from generation_stats import set_adaptive_generation
+
+def load_corpus(path):
+    """Read user messages from a JSONL file (one {"text": ...} object per line)"""
+    messages = []
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"Skipping invalid JSON on line {line_number}", file=sys.stderr)
+                continue
+            text = record.get('text') if isinstance(record, dict) else record
+            if isinstance(text, str) and text.strip():
+                messages.append(text)
+    return messages
+
+def replay_message(text, vader_result=None):
+    """Run one message through the full text pipeline (as /analyze with all fields) and time each stage"""
+    pipeline = AnalysisPipeline(text, vader_result=vader_result)
+    result = pipeline.to_result('text', SENTIMENT_FIELDS, timings=True)
+    return {'path': pipeline.path, 'timings': result['timings']}
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+def summarize(results, wall_time, vader_batch_time=None):
+    """Aggregate per-message results into a report"""
+    paths = Counter(result['path'] for result in results)
+    total = len(results)
+
+    stage_values = {}
+    for result in results:
+        for stage, value in result['timings'].items():
+            stage_values.setdefault(stage, []).append(value)
+
+    stages = {}
+    for stage, values in stage_values.items():
+        values.sort()
+        stages[stage] = {
+            'count': len(values),
+            'mean_ms': round(sum(values) / len(values), 3),
+            'p50_ms': round(percentile(values, 0.5), 3),
+            'p95_ms': round(percentile(values, 0.95), 3),
+            'max_ms': round(values[-1], 3)
+        }
+
+    return {
+        'messages': total,
+        'wall_time_s': round(wall_time, 3),
+        'vader_batch_s': round(vader_batch_time, 3) if vader_batch_time is not None else None,
+        'paths': {path: {'count': count, 'share': round(count / total, 4)} for path, count in paths.items()},
+        'stages': stages
+    }
+
+def diff_reports(current, baseline):
+    """Compare a report against a baseline run"""
+    paths = {}
+    for path in sorted(set(current['paths']) | set(baseline.get('paths', {}))):
+        now = current['paths'].get(path, {'share': 0.0})['share']
+        before = baseline.get('paths', {}).get(path, {'share': 0.0})['share']
+        paths[path] = {'share': now, 'baseline_share': before, 'delta': round(now - before, 4)}
+
+    stages = {}
+    for stage in sorted(set(current['stages']) | set(baseline.get('stages', {}))):
+        now = current['stages'].get(stage)
+        before = baseline.get('stages', {}).get(stage)
+        if now is None or before is None:
+            stages[stage] = {'mean_ms': now and now['mean_ms'], 'baseline_mean_ms': before and before['mean_ms']}
+            continue
+        stages[stage] = {
+            'mean_ms': now['mean_ms'],
+            'baseline_mean_ms': before['mean_ms'],
+            'delta_mean_ms': round(now['mean_ms'] - before['mean_ms'], 3),
+            'p95_ms': now['p95_ms'],
+            'baseline_p95_ms': before['p95_ms'],
+            'delta_p95_ms': round(now['p95_ms'] - before['p95_ms'], 3)
+        }
+
+    return {'paths': paths, 'stages': stages}
+
+def print_report(report, diff=None):
+    print(f"Replayed {report['messages']} messages in {report['wall_time_s']}s")
+    if report.get('vader_batch_s') is not None:
+        print(f"VADER for the whole corpus scored in one batch in {report['vader_batch_s']}s")
+    print("\nResponse paths:")
+    for path, info in sorted(report['paths'].items(), key=lambda item: -item[1]['count']):
+        line = f"  {path:<20} {info['count']:>6}  {info['share'] * 100:6.2f}%"
+        if diff:
+            line += f"  ({diff['paths'][path]['delta'] * 100:+.2f} pts)"
+        print(line)
+
+    print("\nStage timings (ms):")
+    print(f"  {'stage':<20} {'mean':>10} {'p50':>10} {'p95':>10} {'max':>10}")
+    for stage, info in report['stages'].items():
+        line = f"  {stage:<20} {info['mean_ms']:>10.2f} {info['p50_ms']:>10.2f} {info['p95_ms']:>10.2f} {info['max_ms']:>10.2f}"
+        if diff and 'delta_mean_ms' in diff['stages'].get(stage, {}):
+            line += f"  (mean {diff['stages'][stage]['delta_mean_ms']:+.2f})"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a JSONL corpus of user messages through the response pipeline")
+    parser.add_argument('corpus', help="JSONL file with one {\"text\": ...} object per line")
+    parser.add_argument('--workers', type=int, default=4, help="Number of parallel workers")
+    parser.add_argument('--output', help="Write the JSON report to this file (use it later as a baseline)")
+    parser.add_argument('--baseline', help="Saved report to compare against")
+    parser.add_argument('--per-message-vader', action='store_true',
+                        help="Score VADER per message like the server does, instead of once for the whole corpus")
+    parser.add_argument('--no-adaptive-generation', action='store_true',
+                        help="Always attempt generation and don't update generation statistics (reproducible runs)")
+    args = parser.parse_args()
+
+    if args.no_adaptive_generation:
+        set_adaptive_generation(False)
+
+    messages = load_corpus(args.corpus)
+    if not messages:
+        print("No messages found in corpus", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    if args.per_message_vader:
+        vader_scores = [None] * len(messages)
+        vader_batch_time = None
+    else:
+        # Score the whole corpus at once with the vectorized VADER (same scores, several times faster)
+        vader_scores = analyze_with_vader_batch(messages)
+        vader_batch_time = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        results = list(executor.map(replay_message, messages, vader_scores))
+    report = summarize(results, time.perf_counter() - start, vader_batch_time)
+
+    diff = None
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            diff = diff_reports(report, json.load(f))
+        report['baseline_diff'] = diff
+
+    print_report(report, diff)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
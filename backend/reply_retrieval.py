@@ -0,0 +1,105 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModel
+
+from model_registry import register_model, use_model
+from torch_threads import torch_stage
+
+# Small sentence encoder used to match user messages against the curated replies
+RETRIEVAL_MODEL = os.environ.get('RETRIEVAL_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+RETRIEVAL_MODEL_NAME = "retrieval_encoder"
+
+# Precomputed reply embeddings are saved here and memory-mapped on later starts
+RETRIEVAL_INDEX_DIR = os.environ.get('RETRIEVAL_INDEX_DIR', 'retrieval_index')
+
+# Below this cosine similarity no curated reply is considered a match
+RETRIEVAL_MIN_SIMILARITY = float(os.environ.get('RETRIEVAL_MIN_SIMILARITY', '0.35'))
+
+# Batch size used when embedding the reply bank
+RETRIEVAL_BATCH_SIZE = 32
+
+_indexes = {}
+_index_lock = threading.Lock()
+
+def _load_encoder():
+    tokenizer = AutoTokenizer.from_pretrained(RETRIEVAL_MODEL)
+    model = AutoModel.from_pretrained(RETRIEVAL_MODEL)
+    model.eval()
+    return tokenizer, model
+
+register_model(RETRIEVAL_MODEL_NAME, _load_encoder)
+
+def _embed(texts, tokenizer, model):
+    """Mean-pooled, L2-normalized sentence embeddings as a float32 array"""
+    inputs = tokenizer(texts, padding=True, truncation=True, max_length=256, return_tensors="pt")
+    with torch_stage(), torch.no_grad():
+        hidden = model(**inputs).last_hidden_state
+
+    # Average the token vectors, ignoring padding
+    mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+    pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+    pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+    return pooled.numpy().astype(np.float32)
+
+def _index_path(texts):
+    # The file name changes whenever the replies or the encoder change, so stale indexes are never loaded
+    digest = hashlib.sha256("\n".join([RETRIEVAL_MODEL] + list(texts)).encode('utf-8')).hexdigest()
+    return os.path.join(RETRIEVAL_INDEX_DIR, f"{digest[:16]}.npy")
+
+def _get_index(texts, bundle):
+    """Embedding matrix for the reply bank, built once and memory-mapped from disk"""
+    path = _index_path(texts)
+    with _index_lock:
+        index = _indexes.get(path)
+        if index is not None:
+            return index
+
+        if not os.path.exists(path):
+            tokenizer, model = bundle
+            embeddings = np.concatenate([
+                _embed(list(texts[i:i + RETRIEVAL_BATCH_SIZE]), tokenizer, model)
+                for i in range(0, len(texts), RETRIEVAL_BATCH_SIZE)
+            ])
+            try:
+                os.makedirs(RETRIEVAL_INDEX_DIR, exist_ok=True)
+                tmp_path = path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, embeddings)
+                os.replace(tmp_path, path)
+            except OSError:
+                # Unwritable index directory: keep this process's copy in memory instead
+                _indexes[path] = embeddings
+                return embeddings
+
+        index = np.load(path, mmap_mode='r')
+        _indexes[path] = index
+        return index
+
+def retrieve_reply(user_text, texts, candidates=None):
+    """Position of the reply in texts closest to the user's message and its cosine similarity
+    (position is None if the encoder is unavailable or nothing is similar enough).
+    candidates optionally restricts the search to some positions."""
+    if not texts or (candidates is not None and len(candidates) == 0):
+        return None, 0.0
+
+    with use_model(RETRIEVAL_MODEL_NAME) as bundle:
+        if bundle is None:
+            return None, 0.0
+        index = _get_index(texts, bundle)
+        query = _embed([user_text], *bundle)[0]
+
+    # Rows and query are unit length, so one matrix-vector product gives every cosine similarity
+    scores = index @ query
+    if candidates is None:
+        best = int(np.argmax(scores))
+    else:
+        candidates = np.asarray(candidates)
+        best = int(candidates[np.argmax(scores[candidates])])
+    similarity = float(scores[best])
+    if similarity < RETRIEVAL_MIN_SIMILARITY:
+        return None, similarity
+    return best, similarity
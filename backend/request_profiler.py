@@ -0,0 +1,113 @@
+import cProfile
+import functools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+from flask import g, request
+
+# Header that turns on profiling for a single request
+PROFILE_HEADER = "X-Profile-Request"
+
+# Allow clients to request profiles through the header
+PROFILE_HEADER_ENABLED = os.environ.get('PROFILE_HEADER_ENABLED', 'true').lower() == 'true'
+
+# Fraction of requests profiled automatically (0 disables sampling)
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+
+# Where profiles are written and how many are kept
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '50'))
+
+# cProfile can only have one active profiler at a time, so profiled requests take turns
+_profiler_lock = threading.Lock()
+
+def _should_profile():
+    """Check the request header and the sampling rate"""
+    if PROFILE_HEADER_ENABLED and request.headers.get(PROFILE_HEADER, '').lower() in ('1', 'true', 'yes'):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def _prune_profiles():
+    """Keep only the newest PROFILE_MAX_FILES profiles"""
+    profiles = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith('.prof')),
+        key=os.path.getmtime
+    )
+    for path in profiles[:max(0, len(profiles) - PROFILE_MAX_FILES)]:
+        for stale in (path, path[:-len('.prof')] + '.json'):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+def _save_profile(profiler, endpoint, duration, status):
+    """Dump the profile in pstats format together with a small metadata file"""
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{uuid.uuid4().hex[:8]}"
+        profiler.dump_stats(os.path.join(PROFILE_DIR, f"{name}.prof"))
+        with open(os.path.join(PROFILE_DIR, f"{name}.json"), 'w') as f:
+            json.dump({
+                'name': name,
+                'endpoint': endpoint,
+                'duration_ms': round(duration * 1000, 2),
+                'status': status,
+                'created': time.time()
+            }, f)
+        _prune_profiles()
+    except OSError:
+        # Profiling must never break the request
+        pass
+
+def profiled(handler):
+    """Decorator that profiles a Flask handler when requested by header or sampling"""
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not _should_profile() or not _profiler_lock.acquire(blocking=False):
+            return handler(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        status = None
+        g.profiling = True
+        try:
+            profiler.enable()
+            result = handler(*args, **kwargs)
+            # Handlers return either a response or a (response, status) tuple
+            status = result[1] if isinstance(result, tuple) else getattr(result, 'status_code', 200)
+            return result
+        finally:
+            profiler.disable()
+            _profiler_lock.release()
+            _save_profile(profiler, handler.__name__, time.perf_counter() - start, status)
+
+    return wrapper
+
+def is_profiling():
+    """Whether the current request is being profiled (cProfile only sees the handler's thread)"""
+    return g.get('profiling', False)
+
+def list_profiles(limit=20):
+    """Return metadata for the most recent profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta['file'] = os.path.join(PROFILE_DIR, meta['name'] + '.prof')
+        profiles.append(meta)
+
+    profiles.sort(key=lambda meta: meta.get('created', 0), reverse=True)
+    return profiles[:limit]
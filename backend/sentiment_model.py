@@ -2,54 +2,81 @@ import nltk
 from nltk.sentiment import SentimentIntensityAnalyzer
 from transformers import pipeline
 
+from model_registry import register_model, use_model
+from torch_threads import torch_stage
+from vader_batch import BatchVaderScorer
+
 # Ensure NLTK resources are downloaded
 nltk.download("vader_lexicon")
 
-# Initialize analyzers
-vader_analyzer = SentimentIntensityAnalyzer()
+VADER_MODEL_NAME = "vader"
+VADER_BATCH_MODEL_NAME = "vader_batch"
+ROBERTA_MODEL_NAME = "roberta"
+
+def _load_vader_batch():
+    # Precompile NLTK's lexicon into arrays for batch scoring
+    return BatchVaderScorer(SentimentIntensityAnalyzer().lexicon)
+
+def _load_roberta():
+    # Use a specific model to avoid Keras compatibility issues
+    # If this fails the registry remembers it and we use VADER sentiment analysis only
+    return pipeline("sentiment-analysis", model="cardiffnlp/twitter-roberta-base-sentiment-latest")
 
-# Use a specific model to avoid Keras compatibility issues
-try:
-    roberta_pipeline = pipeline("sentiment-analysis", model="cardiffnlp/twitter-roberta-base-sentiment-latest")
-except Exception as e:
-    # Warning: Could not load RoBERTa model: {e}
-    # Will use VADER sentiment analysis only
-    roberta_pipeline = None
+# Analyzers are loaded on first use and may be unloaded when idle
+register_model(VADER_MODEL_NAME, SentimentIntensityAnalyzer)
+register_model(VADER_BATCH_MODEL_NAME, _load_vader_batch)
+register_model(ROBERTA_MODEL_NAME, _load_roberta)
 
 def analyze_with_vader(text):
     """Returns the compound sentiment score using NLTK's VADER."""
-    score = vader_analyzer.polarity_scores(text)
+    with use_model(VADER_MODEL_NAME) as vader_analyzer:
+        score = vader_analyzer.polarity_scores(text)
     return score["compound"]
 
-def analyze_with_roberta(text):
+def analyze_with_vader_batch(texts):
+    """Returns VADER compound scores for a list of texts (same values as analyze_with_vader, much faster for large batches)."""
+    with use_model(VADER_BATCH_MODEL_NAME) as scorer:
+        return [round(float(score), 4) for score in scorer.compound_scores(list(texts))]
+
+def analyze_with_roberta(text, vader_score=None):
     """Returns +1 for positive, -1 for negative, 0 for neutral using RoBERTa."""
-    if roberta_pipeline is None:
-        # Fallback to VADER if RoBERTa is not available
-        vader_score = analyze_with_vader(text)
-        if vader_score > 0.1:
-            return 1
-        elif vader_score < -0.1:
-            return -1
-        else:
-            return 0
-    
-    try:
-        result = roberta_pipeline(text)[0]
-        label = result["label"]
-
-        if label == "POSITIVE":
-            return 1
-        elif label == "NEGATIVE":
-            return -1
-        else:
-            return 0
-    except Exception as e:
-        # RoBERTa analysis failed: {e}
-        # Fallback to VADER
-        vader_score = analyze_with_vader(text)
-        if vader_score > 0.1:
-            return 1
-        elif vader_score < -0.1:
-            return -1
-        else:
-            return 0
+    # Callers that already have the VADER score pass it so the fallback doesn't compute it again
+    # (or a callable returning it, which is only called when the fallback is used)
+    with use_model(ROBERTA_MODEL_NAME) as roberta_pipeline:
+        if roberta_pipeline is None:
+            # Fallback to VADER if RoBERTa is not available
+            if vader_score is None:
+                vader_score = analyze_with_vader(text)
+            elif callable(vader_score):
+                vader_score = vader_score()
+            if vader_score > 0.1:
+                return 1
+            elif vader_score < -0.1:
+                return -1
+            else:
+                return 0
+        
+        try:
+            with torch_stage():
+                result = roberta_pipeline(text)[0]
+            label = result["label"]
+
+            if label == "POSITIVE":
+                return 1
+            elif label == "NEGATIVE":
+                return -1
+            else:
+                return 0
+        except Exception as e:
+            # RoBERTa analysis failed: {e}
+            # Fallback to VADER
+            if vader_score is None:
+                vader_score = analyze_with_vader(text)
+            elif callable(vader_score):
+                vader_score = vader_score()
+            if vader_score > 0.1:
+                return 1
+            elif vader_score < -0.1:
+                return -1
+            else:
+                return 0
@@ -0,0 +1,34 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import torch
+
+# Threads torch may use in total; concurrent torch stages split them, a stage running alone gets all of them
+TORCH_THREADS = int(os.environ.get("TORCH_THREADS", str(os.cpu_count() or 1)))
+
+_active = 0
+_active_lock = threading.Lock()
+
+try:
+    torch.set_num_interop_threads(1)
+except RuntimeError:
+    # Only allowed before torch starts any parallel work
+    pass
+
+def _apply():
+    torch.set_num_threads(max(1, TORCH_THREADS // max(1, _active)))
+
+@contextmanager
+def torch_stage():
+    """Run torch work with a fair share of TORCH_THREADS given how many torch stages are running right now"""
+    global _active
+    with _active_lock:
+        _active += 1
+        _apply()
+    try:
+        yield
+    finally:
+        with _active_lock:
+            _active -= 1
+            _apply()
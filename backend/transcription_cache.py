@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from speech_to_text import transcribe_audio
+
+# Number of transcripts kept in memory
+MEMORY_CACHE_SIZE = int(os.environ.get('TRANSCRIPTION_CACHE_SIZE', '256'))
+
+# Optional on-disk tier (disabled when no directory is configured)
+DISK_CACHE_DIR = os.environ.get('TRANSCRIPTION_CACHE_DIR', '')
+DISK_CACHE_MAX_BYTES = int(os.environ.get('TRANSCRIPTION_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+
+# Transcripts starting with this are transient failures and must not be cached
+TRANSIENT_ERROR_PREFIX = "Speech recognition error"
+
+_memory_cache = OrderedDict()
+_in_flight = {}
+_cache_lock = threading.Lock()
+
+class _InFlightJob:
+    """A transcription that is currently running, shared by concurrent requests"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+def hash_audio_file(file_path):
+    """Return the SHA-256 hex digest of the audio file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _disk_path(key):
+    return os.path.join(DISK_CACHE_DIR, f"{key}.json")
+
+def _read_disk(key):
+    """Look up a transcript in the on-disk tier"""
+    if not DISK_CACHE_DIR:
+        return None
+    path = _disk_path(key)
+    try:
+        with open(path, 'r') as f:
+            text = json.load(f)['text']
+        # Touch the entry so eviction keeps recently used transcripts
+        os.utime(path, None)
+        return text
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _write_disk(key, text):
+    """Store a transcript in the on-disk tier and evict old entries over the size limit"""
+    if not DISK_CACHE_DIR:
+        return
+    try:
+        os.makedirs(DISK_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{_disk_path(key)}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'text': text}, f)
+        os.replace(tmp_path, _disk_path(key))
+        _evict_disk()
+    except OSError:
+        # Disk tier is best effort
+        pass
+
+def _evict_disk():
+    """Delete least recently used entries until the disk tier fits its budget"""
+    entries = []
+    total = 0
+    for name in os.listdir(DISK_CACHE_DIR):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(DISK_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= DISK_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def _remember(key, text):
+    """Store a transcript in the memory tier (called under the lock)"""
+    _memory_cache[key] = text
+    _memory_cache.move_to_end(key)
+    while len(_memory_cache) > MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+def transcribe_audio_cached(file_path, key=None):
+    """Transcribe audio, reusing results for identical content and joining in-flight jobs
+    (pass key if the content hash is already known)"""
+    key = key or hash_audio_file(file_path)
+
+    with _cache_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+
+        job = _in_flight.get(key)
+        owner = job is None
+        if owner:
+            job = _InFlightJob()
+            _in_flight[key] = job
+
+    # Someone else is already transcribing these bytes, wait for their result
+    if not owner:
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    try:
+        text = _read_disk(key)
+        from_disk = text is not None
+        if not from_disk:
+            text = transcribe_audio(file_path)
+
+        cacheable = text is not None and not text.startswith(TRANSIENT_ERROR_PREFIX)
+        if cacheable and not from_disk:
+            _write_disk(key, text)
+
+        with _cache_lock:
+            if cacheable:
+                _remember(key, text)
+            job.result = text
+        return text
+    except Exception as e:
+        job.error = e
+        raise
+    finally:
+        with _cache_lock:
+            _in_flight.pop(key, None)
+        job.done.set()
+
+def clear_transcription_cache():
+    """Drop all in-memory transcripts (the disk tier is left untouched)"""
+    with _cache_lock:
+        _memory_cache.clear()
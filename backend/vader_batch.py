@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Vectorized batch VADER scorer.
+Reimplements NLTK's SentimentIntensityAnalyzer.polarity_scores for lists of
+texts. Tokenization stays in Python, but the lexicon, booster and negation
+rules are precompiled into integer-indexed arrays and the valence rules are
+applied to every token of the batch at once with NumPy.
+
+Run this file directly to check parity with NLTK and compare throughput
+(exits non-zero if any neg/neu/pos/compound score differs by more than the tolerance):
+    python vader_batch.py [corpus.jsonl] [--repeat N]
+    python vader_batch.py --fuzz 20000 [--seed 1]
+"""
+
+import numpy as np
+from nltk.sentiment.vader import VaderConstants
+
+# Characters that can start or end one of VADER's punctuation tokens
+_PUNC_EDGE_CHARS = set("".join(VaderConstants.PUNC_LIST))
+
+# Words the rules look for, beyond the lexicon, boosters and negations
+_SPECIAL_WORDS = ['kind', 'of', 'least', 'at', 'very', 'but', 'never', 'so', 'this']
+
+def _idiom_prefixes(phrases):
+    """First word of every multi-word phrase, used to skip n-gram lookups for most tokens"""
+    return {phrase.split()[0] for phrase in phrases if ' ' in phrase}
+
+class BatchVaderScorer:
+    """Scores lists of texts with the same rules (and lexicon) as NLTK's VADER"""
+
+    def __init__(self, lexicon):
+        constants = VaderConstants()
+        self.constants = constants
+
+        # Vocabulary: every lowercase word any rule can look up; id 0 is "unknown"
+        words = set(lexicon) | set(constants.BOOSTER_DICT) | set(constants.NEGATE) | set(_SPECIAL_WORDS)
+        self.vocab = {word: i for i, word in enumerate(sorted(words), 1)}
+        size = len(self.vocab) + 1
+
+        self.in_lexicon = np.zeros(size, dtype=bool)
+        self.valence = np.zeros(size, dtype=np.float64)
+        self.booster = np.zeros(size, dtype=np.float64)
+        self.is_booster = np.zeros(size, dtype=bool)
+        self.is_negation = np.zeros(size, dtype=bool)
+        for word, i in self.vocab.items():
+            if word in lexicon:
+                self.in_lexicon[i] = True
+                self.valence[i] = lexicon[word]
+            if word in constants.BOOSTER_DICT:
+                self.is_booster[i] = True
+                self.booster[i] = constants.BOOSTER_DICT[word]
+            if word in constants.NEGATE or "n't" in word:
+                self.is_negation[i] = True
+
+        self.word_id = {word: self.vocab[word] for word in _SPECIAL_WORDS}
+
+        # Multi-word rules are matched on the raw (case-sensitive) tokens, like NLTK does
+        self.idioms = constants.SPECIAL_CASE_IDIOMS
+        self.idiom_prefixes = _idiom_prefixes(self.idioms)
+        self.booster_bigrams = {phrase for phrase in constants.BOOSTER_DICT if ' ' in phrase}
+        self.booster_bigram_prefixes = _idiom_prefixes(self.booster_bigrams)
+
+    def _tokenize(self, text):
+        """NLTK's SentiText._words_and_emoticons without building the punctuation product dict"""
+        no_punc_text = self.constants.REGEX_REMOVE_PUNCTUATION.sub("", text)
+        words_only = {w for w in no_punc_text.split() if len(w) > 1}
+
+        tokens = []
+        for we in text.split():
+            if len(we) <= 1:
+                continue
+            if we[0] in _PUNC_EDGE_CHARS or we[-1] in _PUNC_EDGE_CHARS:
+                for punc in self.constants.PUNC_LIST:
+                    if we.startswith(punc) and we[len(punc):] in words_only:
+                        we = we[len(punc):]
+                        break
+                    if we.endswith(punc) and we[:-len(punc)] in words_only:
+                        we = we[:-len(punc)]
+                        break
+            tokens.append(we)
+        return tokens
+
+    def _flatten(self, texts):
+        """Tokenize every text and lay the per-token features out in flat arrays"""
+        ids, upper, lowercase, negated_nt, first_occurrence = [], [], [], [], []
+        doc_of, local_index, doc_length = [], [], []
+        bigram_at, trigram_at, booster_bigram_at = {}, {}, []
+        cap_diff, amplifier, has_tokens = [], [], []
+
+        vocab = self.vocab
+        for d, text in enumerate(texts):
+            if not isinstance(text, str):
+                text = str(text.encode("utf-8"))
+            tokens = self._tokenize(text)
+            n = len(tokens)
+            base = len(ids)
+
+            seen = {}
+            allcaps = 0
+            for i, token in enumerate(tokens):
+                lower = token.lower()
+                is_upper = token.isupper()
+                allcaps += is_upper
+                ids.append(vocab.get(lower, 0))
+                upper.append(is_upper)
+                lowercase.append(token == lower)
+                negated_nt.append("n't" in lower)
+                # NLTK uses words_and_emoticons.index(item), i.e. the first occurrence's context
+                first_occurrence.append(seen.setdefault(token, base + i))
+
+                if token in self.idiom_prefixes:
+                    if i + 1 < n:
+                        value = self.idioms.get(f"{token} {tokens[i + 1]}")
+                        if value is not None:
+                            bigram_at[base + i] = value
+                    if i + 2 < n:
+                        value = self.idioms.get(f"{token} {tokens[i + 1]} {tokens[i + 2]}")
+                        if value is not None:
+                            trigram_at[base + i] = value
+                if token in self.booster_bigram_prefixes and i + 1 < n and f"{token} {tokens[i + 1]}" in self.booster_bigrams:
+                    booster_bigram_at.append(base + i)
+
+            doc_of.extend([d] * n)
+            local_index.extend(range(n))
+            doc_length.extend([n] * n)
+            cap_diff.append(0 < n - allcaps < n)
+            has_tokens.append(n > 0)
+
+            # Punctuation emphasis only depends on the raw text
+            qm_count = text.count("?")
+            qm = 0.0 if qm_count <= 1 else (qm_count * 0.18 if qm_count <= 3 else 0.96)
+            amplifier.append(min(text.count("!"), 4) * 0.292 + qm)
+
+        total = len(ids)
+        bigram = np.full(total, np.nan)
+        trigram = np.full(total, np.nan)
+        if bigram_at:
+            bigram[list(bigram_at)] = list(bigram_at.values())
+        if trigram_at:
+            trigram[list(trigram_at)] = list(trigram_at.values())
+        booster_bigram = np.zeros(total, dtype=bool)
+        booster_bigram[booster_bigram_at] = True
+
+        return {
+            'ids': np.array(ids, dtype=np.int64),
+            'upper': np.array(upper, dtype=bool),
+            'lowercase': np.array(lowercase, dtype=bool),
+            'negated_nt': np.array(negated_nt, dtype=bool),
+            'first': np.array(first_occurrence, dtype=np.int64),
+            'doc': np.array(doc_of, dtype=np.int64),
+            'i': np.array(local_index, dtype=np.int64),
+            'n': np.array(doc_length, dtype=np.int64),
+            'bigram': bigram,
+            'trigram': trigram,
+            'booster_bigram': booster_bigram,
+            'cap_diff': np.array(cap_diff, dtype=bool),
+            'amplifier': np.array(amplifier, dtype=np.float64),
+            'has_tokens': np.array(has_tokens, dtype=bool)
+        }
+
+    def _token_sentiments(self, f):
+        """Per-token valence after all of VADER's rules, for every token in the batch"""
+        c = self.constants
+        ids, i, n = f['ids'], f['i'], f['n']
+        cap_diff = f['cap_diff'][f['doc']]
+        total = len(ids)
+
+        def back(a, m, fill):
+            """a[k - m] (callers mask positions where i < m)"""
+            out = np.full(total, fill, dtype=a.dtype)
+            if m < total:
+                out[m:] = a[:total - m]
+            return out
+
+        def exact(word):
+            return (ids == self.word_id[word]) & f['lowercase']
+
+        in_lex = self.in_lexicon[ids]
+        negated = self.is_negation[ids] | f['negated_nt']
+        so_or_this = exact('so') | exact('this')
+        never = exact('never')
+
+        # Boosters and "kind of" contribute 0 themselves
+        next_is_of = np.zeros(total, dtype=bool)
+        next_is_of[:-1] = ids[1:] == self.word_id['of']
+        skip = self.is_booster[ids] | ((ids == self.word_id['kind']) & (i < n - 1) & next_is_of)
+        scored = in_lex & ~skip
+
+        valence = np.where(scored, self.valence[ids], 0.0)
+        caps = f['upper'] & cap_diff & scored
+        valence = np.where(caps, np.where(valence > 0, valence + c.C_INCR, valence - c.C_INCR), valence)
+
+        for m, damping in ((1, 1.0), (2, 0.95), (3, 0.9)):
+            prev_ids = back(ids, m, 0)
+            applies = scored & (i >= m) & ~self.in_lexicon[prev_ids]
+
+            # Booster/dampener on the preceding word
+            s = self.booster[prev_ids]
+            s = np.where(valence < 0, -s, s)
+            prev_caps = back(f['upper'], m, False) & cap_diff & self.is_booster[prev_ids]
+            s = np.where(prev_caps, np.where(valence > 0, s + c.C_INCR, s - c.C_INCR), s)
+            valence = np.where(applies, valence + s * damping, valence)
+
+            # Negation ("never so/this" intensifies instead)
+            prev_negated = back(negated, m, False)
+            if m == 1:
+                valence = np.where(applies & prev_negated, valence * c.N_SCALAR, valence)
+            elif m == 2:
+                intensify = back(never, 2, False) & back(so_or_this, 1, False)
+                valence = np.where(applies & intensify, valence * 1.5,
+                                   np.where(applies & prev_negated, valence * c.N_SCALAR, valence))
+            else:
+                intensify = (back(never, 3, False) & back(so_or_this, 2, False)) | back(so_or_this, 1, False)
+                valence = np.where(applies & intensify, valence * 1.25,
+                                   np.where(applies & prev_negated, valence * c.N_SCALAR, valence))
+
+                # Idioms: the first match among the preceding n-grams wins, then following n-grams override
+                idiom = np.full(total, np.nan)
+                preceding = [back(f['bigram'], 1, np.nan), back(f['trigram'], 2, np.nan), back(f['bigram'], 2, np.nan),
+                             back(f['trigram'], 3, np.nan), back(f['bigram'], 3, np.nan)]
+                for candidate in reversed(preceding):
+                    idiom = np.where(np.isnan(candidate), idiom, candidate)
+                for candidate in (f['bigram'], f['trigram']):
+                    idiom = np.where(np.isnan(candidate), idiom, candidate)
+                valence = np.where(applies & ~np.isnan(idiom), idiom, valence)
+
+                booster_bigram = back(f['booster_bigram'], 3, False) | back(f['booster_bigram'], 2, False)
+                valence = np.where(applies & booster_bigram, valence + c.B_DECR, valence)
+
+        # "least" negates unless it is "at least" / "very least"
+        prev_ids = back(ids, 1, 0)
+        prev_least = (prev_ids == self.word_id['least']) & ~self.in_lexicon[prev_ids] & (i >= 1)
+        prev2 = back(ids, 2, 0)
+        keeps = (i > 1) & ((prev2 == self.word_id['at']) | (prev2 == self.word_id['very']))
+        valence = np.where(scored & prev_least & ~keeps, valence * c.N_SCALAR, valence)
+
+        # Every occurrence of a token is scored in the context of its first occurrence
+        sentiments = valence[f['first']]
+
+        # "but": halve what comes before it, boost what comes after
+        doc = f['doc']
+        is_but = ids == self.word_id['but']
+        but_index = np.full(len(f['has_tokens']), np.iinfo(np.int64).max)
+        np.minimum.at(but_index, doc[is_but], i[is_but])
+        token_but = but_index[doc]
+        has_but = token_but != np.iinfo(np.int64).max
+        sentiments = np.where(has_but & (i < token_but), sentiments * 0.5,
+                              np.where(has_but & (i > token_but), sentiments * 1.5, sentiments))
+        return sentiments
+
+    def _scores(self, texts):
+        f = self._flatten(texts)
+        docs = len(texts)
+        sentiments = self._token_sentiments(f) if len(f['ids']) else np.zeros(0)
+        doc, amplifier = f['doc'], f['amplifier']
+
+        sum_s = np.bincount(doc, weights=sentiments, minlength=docs)
+        sum_s = np.where(sum_s > 0, sum_s + amplifier, np.where(sum_s < 0, sum_s - amplifier, sum_s))
+        compound = sum_s / np.sqrt(sum_s * sum_s + 15)
+
+        pos_sum = np.bincount(doc, weights=np.where(sentiments > 0, sentiments + 1, 0.0), minlength=docs)
+        neg_sum = np.bincount(doc, weights=np.where(sentiments < 0, sentiments - 1, 0.0), minlength=docs)
+        neu_count = np.bincount(doc, weights=(sentiments == 0).astype(np.float64), minlength=docs)
+
+        more_positive = pos_sum > np.abs(neg_sum)
+        more_negative = pos_sum < np.abs(neg_sum)
+        pos_sum = np.where(more_positive, pos_sum + amplifier, pos_sum)
+        neg_sum = np.where(more_negative, neg_sum - amplifier, neg_sum)
+
+        has_tokens = f['has_tokens']
+        total = np.where(has_tokens, pos_sum + np.abs(neg_sum) + neu_count, 1.0)
+        zero = np.zeros(docs)
+        return {
+            'neg': np.where(has_tokens, np.abs(neg_sum / total), zero),
+            'neu': np.where(has_tokens, np.abs(neu_count / total), zero),
+            'pos': np.where(has_tokens, np.abs(pos_sum / total), zero),
+            'compound': np.where(has_tokens, compound, zero)
+        }
+
+    def compound_scores(self, texts):
+        """Unrounded compound scores for a list of texts, as a NumPy array"""
+        return self._scores(texts)['compound']
+
+    def polarity_scores(self, texts):
+        """NLTK-style rounded score dicts for a list of texts"""
+        scores = self._scores(texts)
+        return [
+            {
+                'neg': round(float(neg), 3),
+                'neu': round(float(neu), 3),
+                'pos': round(float(pos), 3),
+                'compound': round(float(compound), 4)
+            }
+            for neg, neu, pos, compound in zip(scores['neg'], scores['neu'], scores['pos'], scores['compound'])
+        ]
+
+def _sample_texts():
+    return [
+        "I'm feeling anxious about my presentation tomorrow",
+        "The movie was NOT very good!!! :)",
+        "I am so happy today, but work is kind of stressful",
+        "This is the shit, really the bomb",
+        "At least I tried. I don't feel the least bit better",
+        "never so happy, never this sad",
+        "I feel worthless and hopeless and I can't sleep",
+        "Yeah right, that was GREAT",
+        "",
+        "ok",
+        "Good good GOOD, bad!! really?? really???"
+    ]
+
+def _fuzz_texts(lexicon, count, seed):
+    """Reproducible random texts that exercise every rule (boosters, negations, idioms, caps, punctuation)"""
+    import random
+
+    rng = random.Random(seed)
+    constants = VaderConstants()
+    rule_words = _SPECIAL_WORDS + [
+        'the', 'shit', 'bomb', 'bad', 'ass', 'yeah', 'right', 'sort', 'just', 'enough', 'cut', 'mustard',
+        'kiss', 'death', 'hand', 'to', 'mouth', "don't", 'not', 'BUT', 'Never', 'GOOD', 'good', 'great', 'sad', 'happy'
+    ]
+    pool = list(lexicon) + list(constants.BOOSTER_DICT) + list(constants.NEGATE) + rule_words * 30 + ['I', 'you', 'work', 'day'] * 50
+
+    texts = []
+    for _ in range(count):
+        words = []
+        for _ in range(rng.randint(0, 25)):
+            word = rng.choice(pool)
+            roll = rng.random()
+            if roll < 0.1:
+                word = word.upper()
+            elif roll < 0.15:
+                word += rng.choice(['!', '!!', '?', '.', ',', '??', '!?!', ':'])
+            elif roll < 0.18:
+                word = rng.choice(['"', "'", '-']) + word
+            words.append(word)
+        texts.append(' '.join(words))
+    return texts
+
+def main():
+    import argparse
+    import json
+    import time
+    from nltk.sentiment import SentimentIntensityAnalyzer
+
+    parser = argparse.ArgumentParser(description="Check BatchVaderScorer parity with NLTK and compare throughput")
+    parser.add_argument('corpus', nargs='?', help="JSONL file with one {\"text\": ...} object per line (default: built-in samples)")
+    parser.add_argument('--repeat', type=int, default=1, help="Repeat the corpus this many times for the benchmark")
+    parser.add_argument('--fuzz', type=int, default=0, help="Check this many generated texts instead of a corpus")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for --fuzz (the same seed gives the same texts)")
+    parser.add_argument('--tolerance', type=float, default=1e-4, help="Maximum allowed difference for any score")
+    args = parser.parse_args()
+
+    analyzer = SentimentIntensityAnalyzer()
+    scorer = BatchVaderScorer(analyzer.lexicon)
+
+    if args.fuzz:
+        texts = _fuzz_texts(analyzer.lexicon, args.fuzz, args.seed)
+    elif args.corpus:
+        with open(args.corpus, 'r') as f:
+            texts = [json.loads(line).get('text', '') for line in f if line.strip()]
+    else:
+        texts = _sample_texts()
+    texts = texts * max(1, args.repeat)
+
+    start = time.perf_counter()
+    expected = [analyzer.polarity_scores(text)['compound'] for text in texts]
+    nltk_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = scorer.compound_scores(texts)
+    batch_time = time.perf_counter() - start
+
+    # Parity over all four scores, not just the compound used by the app
+    mismatches = []
+    max_difference = 0.0
+    for text, batch_scores in zip(texts, scorer.polarity_scores(texts)):
+        nltk_scores = analyzer.polarity_scores(text)
+        difference = max(abs(batch_scores[key] - nltk_scores[key]) for key in ('neg', 'neu', 'pos', 'compound'))
+        max_difference = max(max_difference, difference)
+        if difference > args.tolerance:
+            mismatches.append((text, nltk_scores, batch_scores))
+
+    print(f"Texts: {len(texts)}")
+    print(f"Max score difference: {max_difference:.6f} ({len(mismatches)} over tolerance {args.tolerance})")
+    for text, nltk_scores, batch_scores in mismatches[:5]:
+        print(f"  {text!r}\n    nltk:  {nltk_scores}\n    batch: {batch_scores}")
+    print(f"NLTK:  {nltk_time:.3f}s ({len(texts) / nltk_time:,.0f} texts/s)")
+    print(f"Batch: {batch_time:.3f}s ({len(texts) / batch_time:,.0f} texts/s, {nltk_time / batch_time:.1f}x)")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())